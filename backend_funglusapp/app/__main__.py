@@ -0,0 +1,36 @@
+# backend_funglusapp/app/__main__.py
+"""
+Arranque de la API: `python -m app` desde backend_funglusapp.
+
+Con settings.WORKERS > 1 uvicorn lanza varios procesos que comparten la BD
+(modo WAL) y se avisan las escrituras por la tabla cache_eventos. Lo que debe
+pasar una sola vez se hace aquí antes de crear los workers.
+"""
+
+import uvicorn
+from app.core.config import settings
+
+
+def main() -> None:
+    if settings.WORKERS > 1:
+        from app.crud import crud_escritura_diferida
+        from app.db import database
+        from app.main import preparar_base_de_datos
+
+        # Los workers no migran ni crean tablas: arrancan con el esquema ya al día
+        preparar_base_de_datos()
+        # Reaplica un diario de escritura diferida que haya quedado de una caída
+        # (y falla si la escritura diferida está activada junto con varios workers)
+        crud_escritura_diferida.iniciar()
+        crud_escritura_diferida.detener()
+        database.engine.dispose()
+    uvicorn.run(
+        "app.main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=settings.WORKERS,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,37 @@ class Settings(BaseSettings):
     APP_NAME: str = "FunglusApp Backend (Simplified V2)"
     # La base de datos se creará en la raíz de backend_funglusapp (donde ejecutas uvicorn)
     DATABASE_URL: str = "sqlite:///./funglusapp_db_simple.db" 
+    # Carpeta donde se guardan los ciclos cerrados (archivos comprimidos de solo lectura)
+    ARCHIVO_DIR: str = "./archivo"
+    # Si es True, los PUT .../entry rechazan (422) valores fuera de rango o pesos invertidos
+    CALIDAD_VALIDAR_EN_PUT: bool = False
+    # Procesos para cálculos pesados fuera del hilo de la petición
+    POOL_MAX_WORKERS: int = 2
+    # Las formulaciones con más recetas candidatas que esto se resuelven en el pool
+    FORMULACION_UMBRAL_POOL: int = 200_000
+    # Trabajos en segundo plano (/api/v1/jobs): "process" o "thread". Con "thread" los
+    # cálculos de los jobs (formulación, escaneos) compiten por el GIL con la API
+    JOBS_EJECUTOR: str = "process"
+    JOBS_MAX_WORKERS: int = 2
+    # Escritura diferida de los PUT .../entry: los cambios se confirman en un diario
+    # (fsync) y se vuelcan a SQLite en grupo cada INTERVALO segundos o al llegar a
+    # MAX_PENDIENTES filas distintas (ver crud_escritura_diferida)
+    ESCRITURA_DIFERIDA: bool = False
+    ESCRITURA_DIFERIDA_INTERVALO: float = 1.0
+    ESCRITURA_DIFERIDA_MAX_PENDIENTES: int = 500
+    ESCRITURA_DIFERIDA_DIARIO: str = "./escritura_diferida.diario"
+    # Despliegue multiproceso (python -m app): número de procesos de uvicorn. Con
+    # WORKERS > 1 la BD pasa a modo WAL y las cachés en memoria se invalidan entre
+    # procesos con la tabla cache_eventos, sondeada cada EVENTOS_SONDEO_INTERVALO s
+    WORKERS: int = 1
+    HOST: str = "127.0.0.1"
+    PORT: int = 8000
+    EVENTOS_SONDEO_INTERVALO: float = 0.25
+    # Pool de conexiones de cada worker (en total: WORKERS x (SIZE + MAX_OVERFLOW))
+    # y segundos que una conexión espera si otro proceso tiene la BD bloqueada
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_BUSY_TIMEOUT: float = 5.0
 
     class Config:
         env_file = ".env" # Si decides usar un archivo .env para configuraciones
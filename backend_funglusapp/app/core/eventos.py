@@ -0,0 +1,38 @@
+# backend_funglusapp/app/core/eventos.py
+from typing import Callable, List, Optional
+
+# Avisos de escritura sobre las tablas de laboratorio. Los CRUD llaman a
+# notificar_escritura después de cada commit y los módulos que mantienen cachés
+# en memoria (calidad, formulación, ...) se registran para invalidarlas.
+
+Oyente = Callable[[str, Optional[str], Optional[str], Optional[str]], None]
+
+# tabla=TODAS y ciclo=None significa "cualquier dato pudo cambiar": los oyentes
+# deben vaciar sus cachés por completo.
+TODAS = "*"
+
+_oyentes: List[Oyente] = []
+
+
+def registrar_oyente(oyente: Oyente) -> Oyente:
+    """Registra una función oyente(tabla, ciclo, origen, muestra). Usable como decorador."""
+    _oyentes.append(oyente)
+    return oyente
+
+
+def notificar_escritura(
+    tabla: str,
+    ciclo: Optional[str],
+    origen: Optional[str] = None,
+    muestra: Optional[str] = None,
+) -> None:
+    for oyente in _oyentes:
+        try:
+            oyente(tabla, ciclo, origen, muestra)
+        except Exception as e:
+            # Un oyente roto no debe tumbar la escritura que ya se confirmó
+            print(f"EVENTOS: ERROR en oyente {oyente.__name__} para '{tabla}': {e}")
+
+
+def invalidar_todo() -> None:
+    notificar_escritura(TODAS, None)
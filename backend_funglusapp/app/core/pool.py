@@ -0,0 +1,48 @@
+# backend_funglusapp/app/core/pool.py
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, Optional
+
+from app.core.config import settings
+
+# Pool de procesos compartido para cálculos pesados (p. ej. la formulación).
+# Se crea bajo demanda para no lanzar procesos si nunca se necesitan.
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def crear_ejecutor(
+    tipo: str, max_workers: int, inicializador: Optional[Callable[[], None]] = None
+) -> Executor:
+    """Crea un pool de hilos ("thread") o de procesos ("process")."""
+    if tipo == "process":
+        # spawn y no fork (el valor por defecto en Linux): el servidor tiene hilos y un
+        # fork copiaría locks tomados, conexiones y buffers a medias
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=get_context("spawn"),
+            initializer=inicializador,
+        )
+    if tipo == "thread":
+        return ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="funglus-job",
+            initializer=inicializador,
+        )
+    raise ValueError(f"Tipo de ejecutor desconocido: '{tipo}' (usa thread o process)")
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = crear_ejecutor("process", settings.POOL_MAX_WORKERS)
+        print(
+            f"INFO:     Pool de procesos iniciado con {settings.POOL_MAX_WORKERS} workers."
+        )
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
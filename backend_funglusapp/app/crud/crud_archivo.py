@@ -0,0 +1,291 @@
+# backend_funglusapp/app/crud/crud_archivo.py
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from types import SimpleNamespace
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from app.core import eventos
+from app.core.config import settings
+from app.crud import crud_cache_eventos, crud_escritura_diferida
+from app.db import dimensiones, models
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+# Los ciclos cerrados no se vuelven a editar. Para que no inflen los índices de
+# las tablas de laboratorio se mueven a un archivo gzip por ciclo (JSON en formato
+# columnar: {tabla: {columna: [valores]}}) y se registran en la tabla
+# "ciclos_archivados". Las lecturas combinan las filas activas con las archivadas.
+
+TABLAS_ARCHIVABLES = {
+    models.MateriaPrima.__tablename__: models.MateriaPrima,
+    models.Gubys.__tablename__: models.Gubys,
+    models.TamoHumedo.__tablename__: models.TamoHumedo,
+}
+
+FORMATO_ARCHIVO = 1
+
+
+class CicloArchivadoError(Exception):
+    """Se intentó crear o modificar una entrada de un ciclo archivado (solo lectura)."""
+
+    def __init__(self, ciclo: str):
+        self.ciclo = ciclo
+        super().__init__(f"El ciclo '{ciclo}' está archivado y es de solo lectura.")
+
+
+def _columnas(modelo) -> List[str]:
+    # Las claves se archivan en texto (ciclo/origen/muestra), no como IDs de dimensión
+    return [
+        columna.name[: -len("_id")] if columna.foreign_keys else columna.name
+        for columna in modelo.__table__.columns
+    ]
+
+
+def _ruta_archivo(ciclo: str) -> str:
+    # El nombre del ciclo es texto libre: se limpia para el sistema de archivos y se
+    # añade un hash corto para que dos ciclos distintos nunca compartan archivo.
+    seguro = re.sub(r"[^A-Z0-9_.-]", "_", ciclo)
+    sufijo = hashlib.sha1(ciclo.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(settings.ARCHIVO_DIR, f"ciclo_{seguro}_{sufijo}.json.gz")
+
+
+def _escribir_archivo(ruta: str, contenido: dict) -> None:
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(gzip.compress(json.dumps(contenido).encode("utf-8")))
+        f.flush()
+        os.fsync(f.fileno())
+    if os.path.exists(ruta):
+        # Restos de un intento anterior que no llegó a confirmarse en la BD
+        os.chmod(ruta, 0o644)
+    os.replace(temporal, ruta)
+    os.chmod(ruta, 0o444)
+
+
+def _cargar_archivo(ruta: str) -> dict:
+    with open(ruta, "rb") as f:
+        return json.loads(gzip.decompress(f.read()).decode("utf-8"))
+
+
+@lru_cache(maxsize=None)
+def _filas_de_archivo(ruta: str) -> Dict[str, List[SimpleNamespace]]:
+    # Filas de cada tabla de un archivo, ordenadas por key desc. Un archivo registrado
+    # no cambia, así que se convierte una sola vez por proceso (y una sola copia).
+    filas = {}
+    for tabla, columnas in _cargar_archivo(ruta)["tablas"].items():
+        nombres = list(columnas.keys())
+        filas[tabla] = sorted(
+            (
+                SimpleNamespace(**dict(zip(nombres, valores)))
+                for valores in zip(*columnas.values())
+            ),
+            key=lambda fila: fila.key,
+            reverse=True,
+        )
+    return filas
+
+
+def _filas_tabla(tabla: str, rutas: List[str]) -> Iterator[SimpleNamespace]:
+    # Mezcla por key desc las listas de cada archivo sin copiarlas
+    return heapq.merge(
+        *(_filas_de_archivo(ruta).get(tabla, []) for ruta in rutas),
+        key=lambda fila: fila.key,
+        reverse=True,
+    )
+
+
+def reservar_keys(conexion, maximas: Dict[str, int]) -> None:
+    """
+    Sube sqlite_sequence de cada tabla hasta la key indicada para que AUTOINCREMENT
+    no reutilice keys de filas archivadas: las lecturas combinan filas activas y
+    archivadas por key y asumen que es única. `conexion` puede ser una sesión.
+    """
+    for tabla, maxima in maximas.items():
+        actual = conexion.execute(
+            text("SELECT seq FROM sqlite_sequence WHERE name = :tabla"),
+            {"tabla": tabla},
+        ).scalar()
+        if actual is None:
+            conexion.execute(
+                text("INSERT INTO sqlite_sequence (name, seq) VALUES (:tabla, :seq)"),
+                {"tabla": tabla, "seq": maxima},
+            )
+        elif actual < maxima:
+            conexion.execute(
+                text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :tabla"),
+                {"tabla": tabla, "seq": maxima},
+            )
+
+
+def keys_maximas_archivadas(conexion) -> Dict[str, int]:
+    """Mayor key archivada de cada tabla, leyendo todos los archivos registrados."""
+    maximas: Dict[str, int] = {}
+    for (ruta,) in conexion.execute(select(models.CicloArchivado.ruta)):
+        for tabla, columnas in _cargar_archivo(ruta)["tablas"].items():
+            if columnas.get("key"):
+                maximas[tabla] = max(maximas.get(tabla, 0), max(columnas["key"]))
+    return maximas
+
+
+def get_ciclos_archivados(db: Session) -> List[models.CicloArchivado]:
+    return (
+        db.query(models.CicloArchivado)
+        .order_by(models.CicloArchivado.ciclo.desc())
+        .all()
+    )
+
+
+def get_ciclo_archivado(db: Session, ciclo: str) -> Optional[models.CicloArchivado]:
+    return db.get(models.CicloArchivado, ciclo.strip().upper())
+
+
+def bloquear_escritura(db: Session, ciclo: str) -> None:
+    """
+    Toma el lock de escritura de SQLite (BEGIN IMMEDIATE) hasta el commit/rollback
+    de `db` y comprueba que el ciclo (ya limpio) no esté archivado. Sin el lock, un
+    archivado podría colarse entre la comprobación y el commit de una escritura.
+    """
+    db.execute(text("BEGIN IMMEDIATE"))
+    if get_ciclo_archivado(db, ciclo):
+        db.rollback()
+        raise CicloArchivadoError(ciclo)
+
+
+def get_filas_archivadas(
+    db: Session, tabla: str, ciclo: Optional[str] = None
+) -> Iterable[SimpleNamespace]:
+    """
+    Devuelve las filas archivadas de una tabla de laboratorio (todas, o solo las de
+    un ciclo), ordenadas por key descendente. Los objetos tienen los mismos atributos
+    que el modelo, así que sirven directamente para los response_model *InDB.
+    Con un ciclo es una lista; sin él, un iterador que recorre todos los archivos.
+    """
+    if ciclo is not None:
+        registro = get_ciclo_archivado(db, ciclo)
+        if not registro:
+            return []
+        return _filas_de_archivo(registro.ruta).get(tabla, [])
+    return _filas_tabla(tabla, [r.ruta for r in get_ciclos_archivados(db)])
+
+
+def buscar_fila_archivada(
+    db: Session, modelo, ciclo: str, origen: str, muestra: Optional[str] = None
+) -> Optional[SimpleNamespace]:
+    """Busca una entrada concreta dentro del archivo de un ciclo (claves ya limpias)."""
+    for fila in get_filas_archivadas(db, modelo.__tablename__, ciclo):
+        if fila.origen == origen and (muestra is None or fila.muestra == muestra):
+            return fila
+    return None
+
+
+def combinar_con_archivo(db: Session, modelo, skip: int, limit: int) -> list:
+    """
+    Paginación (key desc) sobre la unión de las filas activas y las archivadas.
+    Sin ciclos archivados equivale a la consulta original sobre la tabla activa.
+    """
+    consulta_activa = db.query(modelo).order_by(modelo.key.desc())
+    rutas = [registro.ruta for registro in get_ciclos_archivados(db)]
+    if not rutas:
+        return consulta_activa.offset(skip).limit(limit).all()
+
+    activas = consulta_activa.limit(skip + limit).all()
+    combinadas = heapq.merge(
+        activas,
+        _filas_tabla(modelo.__tablename__, rutas),
+        key=lambda fila: fila.key,
+        reverse=True,
+    )
+    return list(islice(combinadas, skip, skip + limit))
+
+
+def _mover_a_archivo(db: Session, clean_ciclo: str) -> Optional[models.CicloArchivado]:
+    # Se llama con el lock de escritura tomado (ver archivar_ciclo)
+    ciclo_id = dimensiones.obtener_id(models.DimCiclo, clean_ciclo)
+    contenido = {"formato": FORMATO_ARCHIVO, "ciclo": clean_ciclo, "tablas": {}}
+    total_filas = 0
+    for tabla, modelo in TABLAS_ARCHIVABLES.items():
+        filas = (
+            db.query(modelo)
+            .filter(modelo.ciclo_id == ciclo_id)
+            .order_by(modelo.key.desc())
+            .all()
+        )
+        contenido["tablas"][tabla] = {
+            columna: [getattr(fila, columna) for fila in filas]
+            for columna in _columnas(modelo)
+        }
+        total_filas += len(filas)
+
+    if total_filas == 0:
+        return None
+
+    ruta = _ruta_archivo(clean_ciclo)
+    # El archivo se escribe (y sincroniza) antes de borrar nada: si el proceso cae
+    # a mitad, las filas siguen en la BD y el archivo se reescribe en el próximo intento.
+    # Nada lee el archivo hasta que el commit lo registra: no hay caché que limpiar
+    _escribir_archivo(ruta, contenido)
+
+    registro = models.CicloArchivado(
+        ciclo=clean_ciclo,
+        ruta=ruta,
+        filas=total_filas,
+        archivado_en=datetime.now().isoformat(timespec="seconds"),
+    )
+    db.add(registro)
+    reservar_keys(
+        db,
+        {
+            tabla: max(columnas["key"])
+            for tabla, columnas in contenido["tablas"].items()
+            if columnas["key"]
+        },
+    )
+    for tabla, modelo in TABLAS_ARCHIVABLES.items():
+        db.query(modelo).filter(modelo.ciclo_id == ciclo_id).delete(
+            synchronize_session=False
+        )
+        crud_cache_eventos.publicar(db, tabla, clean_ciclo)
+    db.commit()
+    return registro
+
+
+def archivar_ciclo(db: Session, ciclo: str) -> Optional[models.CicloArchivado]:
+    """
+    Mueve todas las filas de un ciclo cerrado a su archivo comprimido y las borra
+    de las tablas activas. Devuelve None si el ciclo no tiene filas.
+    """
+    clean_ciclo = ciclo.strip().upper()
+    if get_ciclo_archivado(db, clean_ciclo):
+        raise CicloArchivadoError(clean_ciclo)
+    # Los PUT diferidos del ciclo se vuelcan ya (quedan dentro del archivo) y los que
+    # lleguen mientras se archiva se rechazan
+    with crud_escritura_diferida.ciclo_bloqueado(clean_ciclo):
+        # Desde aquí hasta el commit ninguna otra escritura puede tocar el ciclo: lo
+        # que se lee es exactamente lo que se borra
+        bloquear_escritura(db, clean_ciclo)
+        try:
+            registro = _mover_a_archivo(db, clean_ciclo)
+        except Exception as e:
+            db.rollback()
+            print(f"CRUD Archivo: ERROR al archivar ciclo '{clean_ciclo}': {e}")
+            raise
+    if registro is None:
+        db.rollback()
+        print(f"CRUD Archivo: El ciclo '{clean_ciclo}' no tiene filas para archivar.")
+        return None
+    db.refresh(registro)
+    for tabla in TABLAS_ARCHIVABLES:
+        eventos.notificar_escritura(tabla, clean_ciclo)
+    print(
+        f"CRUD Archivo: Ciclo '{clean_ciclo}' archivado en '{registro.ruta}' "
+        f"({registro.filas} filas)"
+    )
+    return registro
@@ -0,0 +1,129 @@
+# backend_funglusapp/app/crud/crud_cache_eventos.py
+import os
+import threading
+import time
+from typing import Optional
+
+from app.core import eventos
+from app.core.config import settings
+from app.db import database, models
+from sqlalchemy import delete, func, insert, select
+
+# Canal de invalidación entre workers (settings.WORKERS > 1). Cada escritura añade
+# una fila a "cache_eventos" con publicar(), dentro de su propia transacción; un hilo
+# por proceso lee cada EVENTOS_SONDEO_INTERVALO segundos las filas nuevas de los
+# demás procesos y las vuelve a emitir localmente, así las cachés
+# (calidad, formulación, índice de claves) se invalidan igual que con un solo proceso.
+# Tras una escritura en otro worker, una lectura puede ver la caché anterior como
+# mucho durante un intervalo de sondeo.
+
+RETENCION_SEGUNDOS = 300  # Los avisos más viejos se borran
+PODA_CADA_SEGUNDOS = 60
+
+_ultimo_id = 0
+_hilo: Optional[threading.Thread] = None
+_detener = threading.Event()
+
+
+def activo() -> bool:
+    return settings.WORKERS > 1
+
+
+def publicar(conexion, tabla: str, ciclo, origen=None, muestra=None) -> None:
+    """
+    Añade el aviso de una escritura a la transacción en curso de `conexion` (sesión
+    o conexión). Se llama antes del commit de los datos: el aviso queda guardado si
+    y solo si el cambio queda guardado.
+    """
+    if not activo():
+        return
+    conexion.execute(
+        insert(models.CacheEvento).values(
+            tabla=tabla,
+            ciclo=ciclo,
+            origen=origen,
+            muestra=muestra,
+            pid=os.getpid(),
+            creado_en=time.time(),
+        )
+    )
+
+
+def recibir() -> int:
+    """Reemite los avisos nuevos de otros procesos. Devuelve cuántos reemitió."""
+    global _ultimo_id
+    with database.engine.connect() as conexion:
+        filas = conexion.execute(
+            select(models.CacheEvento)
+            .where(models.CacheEvento.id > _ultimo_id)
+            .order_by(models.CacheEvento.id)
+        ).fetchall()
+        primero = (
+            conexion.execute(select(func.min(models.CacheEvento.id))).scalar()
+            if filas
+            else None
+        )
+    if not filas:
+        return 0
+
+    propio = os.getpid()
+    reemitidos = 0
+    if primero > _ultimo_id + 1 and _ultimo_id > 0:
+        # Se podaron avisos que este proceso no llegó a leer: no se sabe qué cambió
+        eventos.invalidar_todo()
+    for fila in filas:
+        if fila.pid != propio:
+            eventos.notificar_escritura(
+                fila.tabla, fila.ciclo, fila.origen, fila.muestra
+            )
+            reemitidos += 1
+    _ultimo_id = filas[-1].id
+    return reemitidos
+
+
+def podar() -> None:
+    with database.engine.begin() as conexion:
+        conexion.execute(
+            delete(models.CacheEvento).where(
+                models.CacheEvento.creado_en < time.time() - RETENCION_SEGUNDOS
+            )
+        )
+
+
+def _bucle() -> None:
+    ultima_poda = 0.0
+    while not _detener.wait(settings.EVENTOS_SONDEO_INTERVALO):
+        try:
+            recibir()
+            if time.time() - ultima_poda > PODA_CADA_SEGUNDOS:
+                podar()
+                ultima_poda = time.time()
+        except Exception as e:
+            print(f"CRUD CacheEventos: ERROR al leer avisos de otros workers: {e}")
+
+
+def iniciar() -> None:
+    """Empieza a escuchar a los demás workers (solo con settings.WORKERS > 1)."""
+    global _ultimo_id, _hilo
+    if not activo() or _hilo is not None:
+        return
+    # Las cachés de este proceso se acaban de construir: solo interesa lo que venga
+    with database.engine.connect() as conexion:
+        _ultimo_id = (
+            conexion.execute(select(func.max(models.CacheEvento.id))).scalar() or 0
+        )
+    _detener.clear()
+    _hilo = threading.Thread(target=_bucle, name="cache-eventos", daemon=True)
+    _hilo.start()
+    print(
+        f"INFO:     Canal de caché entre workers activo (pid {os.getpid()}, "
+        f"sondeo cada {settings.EVENTOS_SONDEO_INTERVALO}s)."
+    )
+
+
+def detener() -> None:
+    global _hilo
+    _detener.set()
+    if _hilo is not None:
+        _hilo.join()
+        _hilo = None
@@ -0,0 +1,343 @@
+# backend_funglusapp/app/crud/crud_calidad.py
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from app.core import eventos
+from app.crud import crud_archivo, crud_escritura_diferida
+from app.db import dimensiones, models
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+# Motor de calidad de datos: detecta errores de digitación (ph=70 en vez de 7.0,
+# p1h1/p2h2 intercambiados, ...) que los schemas *DataUpdate no ven porque solo
+# validan tipos. Cada escaneo carga una tabla completa (activa + archivo) en
+# arreglos numpy y aplica todas las reglas de forma vectorizada.
+
+TABLAS_CALIDAD = {
+    "materia_prima": models.MateriaPrima,
+    "gubys": models.Gubys,
+    "tamo_humedo": models.TamoHumedo,
+}
+
+# Rangos físicamente plausibles (inclusive). None = sin límite por ese lado.
+RANGOS = {
+    "p1h1": (0.0, None),
+    "p2h2": (0.0, None),
+    "p_ph": (0.0, None),
+    "porc_h1": (0.0, 100.0),
+    "porc_h2": (0.0, 100.0),
+    "ph": (0.0, 14.0),
+    "d1": (0.0, None),
+    "d2": (0.0, None),
+    "d3": (0.0, None),
+}
+
+# Atípicos robustos: |0.6745 * (x - mediana) / MAD| > UMBRAL_Z dentro del grupo
+# (origen, y además muestra en Materia Prima) a lo largo de todos los ciclos.
+UMBRAL_Z = 3.5
+MIN_MUESTRAS_GRUPO = 5
+
+
+class DatosFueraDeRangoError(Exception):
+    """La actualización deja la entrada con valores imposibles (validación en el PUT)."""
+
+    def __init__(self, hallazgos: List[dict]):
+        self.hallazgos = hallazgos
+        super().__init__("; ".join(f"{h['campo']}: {h['detalle']}" for h in hallazgos))
+
+
+def _campos(modelo) -> List[str]:
+    return [campo for campo in RANGOS if hasattr(modelo, campo)]
+
+
+def _hallazgo(tabla, key, ciclo, origen, muestra, campo, valor, regla, detalle):
+    return {
+        "tabla": tabla,
+        "key": int(key),
+        "ciclo": ciclo,
+        "origen": origen,
+        "muestra": muestra,
+        "campo": campo,
+        "valor": None if valor is None or np.isnan(valor) else float(valor),
+        "regla": regla,
+        "detalle": detalle,
+    }
+
+
+def _detalle_rango(campo: str) -> str:
+    inferior, superior = RANGOS[campo]
+    return f"fuera del rango plausible [{inferior}, {'∞' if superior is None else superior}]"
+
+
+def _cargar_tabla(db: Session, modelo) -> Dict[str, np.ndarray]:
+    """Carga una tabla entera (filas activas + archivadas) como columnas numpy."""
+    claves = ["ciclo", "origen"] + (["muestra"] if hasattr(modelo, "muestra") else [])
+    campos = _campos(modelo)
+    columnas = ["key"] + claves + campos
+    # Consulta Core sobre la conexión: evita construir objetos ORM por fila. Las
+    # claves llegan como IDs y se traducen con la caché de dimensiones.
+    consulta = select(
+        modelo.key,
+        *[getattr(modelo, f"{c}_id") for c in claves],
+        *[getattr(modelo, c) for c in campos],
+    )
+    filas = db.connection().execute(consulta).fetchall()
+    valores = [list(c) for c in zip(*filas)] if filas else [[] for _ in columnas]
+    for i, clave in enumerate(claves, start=1):
+        valores[i] = dimensiones.obtener_valores(models.DIMENSIONES[clave], valores[i])
+    for fila in crud_archivo.get_filas_archivadas(db, modelo.__tablename__):
+        for lista, columna in zip(valores, columnas):
+            lista.append(getattr(fila, columna))
+    datos = {}
+    for nombre, columna in zip(columnas, valores):
+        if nombre in campos:
+            # None -> NaN: los campos vacíos no disparan ninguna regla
+            datos[nombre] = np.array(columna, dtype=float)
+        else:
+            datos[nombre] = np.array(columna, dtype=object)
+    return datos
+
+
+def _medianas_por_grupo(valores: np.ndarray, grupos: np.ndarray, inicios: np.ndarray):
+    """
+    Mediana de cada columna por grupo, ignorando NaN (como np.nanmedian). Las filas
+    van ordenadas por `grupos` e `inicios` es la primera fila de cada grupo.
+    Devuelve (medianas, validos), ambos de forma (grupos, columnas).
+    """
+    validos = np.add.reduceat((~np.isnan(valores)).astype(np.int64), inicios, axis=0)
+    medianas = np.full(validos.shape, np.nan)
+    for columna in range(valores.shape[1]):
+        # Dentro de cada grupo los valores quedan crecientes y los NaN al final
+        ordenados = valores[np.lexsort((valores[:, columna], grupos)), columna]
+        cuantos = validos[:, columna]
+        con_datos = cuantos > 0
+        bajo = (inicios + (cuantos - 1) // 2)[con_datos]
+        alto = (inicios + cuantos // 2)[con_datos]
+        medianas[con_datos, columna] = (ordenados[bajo] + ordenados[alto]) / 2
+    return medianas, validos
+
+
+def _escanear(tabla: str, modelo, datos: Dict[str, np.ndarray]) -> List[dict]:
+    campos = _campos(modelo)
+    n_filas = len(datos["key"])
+    if n_filas == 0:
+        return []
+    muestras = datos.get("muestra", np.full(n_filas, None, dtype=object))
+    matriz = np.column_stack([datos[c] for c in campos])  # (filas, campos)
+
+    # 1) Rangos plausibles
+    inferiores = np.array(
+        [RANGOS[c][0] if RANGOS[c][0] is not None else -np.inf for c in campos]
+    )
+    superiores = np.array(
+        [RANGOS[c][1] if RANGOS[c][1] is not None else np.inf for c in campos]
+    )
+    fuera_rango = (matriz < inferiores) | (matriz > superiores)
+
+    # 2) Consistencia de pesos: tras el secado el peso no puede aumentar
+    pesos_invertidos = datos["p2h2"] > datos["p1h1"]
+
+    # 3) Atípicos robustos (mediana/MAD) por grupo a través de los ciclos
+    grupos = np.array(
+        [
+            f"{m}/{o}" if m is not None else str(o)
+            for m, o in zip(muestras, datos["origen"])
+        ],
+        dtype=object,
+    )
+    _, inversa = np.unique(grupos.astype(str), return_inverse=True)
+    # Las filas ya marcadas por rango no entran al cálculo de mediana/MAD
+    limpia = np.where(fuera_rango, np.nan, matriz)
+    # Filas de cada grupo contiguas: todos los grupos se resuelven en un solo recorrido
+    orden = np.argsort(inversa, kind="stable")
+    grupos_ordenados = inversa[orden]
+    inicios = np.concatenate(([0], np.flatnonzero(np.diff(grupos_ordenados)) + 1))
+    bloque = limpia[orden]
+    mediana, validos = _medianas_por_grupo(bloque, grupos_ordenados, inicios)
+    mad, _ = _medianas_por_grupo(
+        np.abs(bloque - mediana[grupos_ordenados]), grupos_ordenados, inicios
+    )
+    with np.errstate(all="ignore"):
+        puntaje_z = 0.6745 * (matriz - mediana[inversa]) / mad[inversa]
+    # Grupos con pocas muestras válidas en la columna o sin dispersión: sin puntaje
+    descartar = (validos < MIN_MUESTRAS_GRUPO) | (mad == 0) | np.isnan(mad)
+    puntaje_z[descartar[inversa]] = 0.0
+    puntaje_z = np.nan_to_num(puntaje_z)
+    atipicos = (np.abs(puntaje_z) > UMBRAL_Z) & ~fuera_rango
+
+    hallazgos = []
+    for fila, columna in zip(*np.nonzero(fuera_rango)):
+        campo = campos[columna]
+        hallazgos.append(
+            _hallazgo(
+                tabla,
+                datos["key"][fila],
+                datos["ciclo"][fila],
+                datos["origen"][fila],
+                muestras[fila],
+                campo,
+                matriz[fila, columna],
+                "rango",
+                _detalle_rango(campo),
+            )
+        )
+    for fila in np.nonzero(pesos_invertidos)[0]:
+        hallazgos.append(
+            _hallazgo(
+                tabla,
+                datos["key"][fila],
+                datos["ciclo"][fila],
+                datos["origen"][fila],
+                muestras[fila],
+                "p2h2",
+                datos["p2h2"][fila],
+                "pesos",
+                f"p2h2 ({datos['p2h2'][fila]}) mayor que p1h1 ({datos['p1h1'][fila]})",
+            )
+        )
+    for fila, columna in zip(*np.nonzero(atipicos)):
+        hallazgos.append(
+            _hallazgo(
+                tabla,
+                datos["key"][fila],
+                datos["ciclo"][fila],
+                datos["origen"][fila],
+                muestras[fila],
+                campos[columna],
+                matriz[fila, columna],
+                "atipico",
+                f"puntaje z robusto {puntaje_z[fila, columna]:.1f} respecto a su origen",
+            )
+        )
+    return hallazgos
+
+
+# --- Caché por tabla ---
+# _cache[tabla][ciclo] = hallazgos del ciclo. Las medianas/MAD de los atípicos
+# dependen de todos los ciclos, así que cualquier escritura en una tabla descarta
+# sus resultados completos (también los de otros ciclos). El escaneo corre fuera
+# del lock; _generacion evita guardar un resultado calculado antes de una escritura,
+# y así el PUT (que invalida tras su commit) nunca espera a un escaneo.
+_cache: Dict[str, Dict[str, List[dict]]] = {}
+_filas_por_ciclo: Dict[str, Dict[str, int]] = {}
+_generacion = 0
+_lock = threading.Lock()
+_NOMBRE_CORTO = {
+    modelo.__tablename__: nombre for nombre, modelo in TABLAS_CALIDAD.items()
+}
+
+
+@eventos.registrar_oyente
+def _invalidar_cache(tabla: str, ciclo: str, origen=None, muestra=None) -> None:
+    global _generacion
+    if tabla == eventos.TODAS:
+        with _lock:
+            _cache.clear()
+            _filas_por_ciclo.clear()
+            _generacion += 1
+        return
+    nombre = _NOMBRE_CORTO.get(tabla)
+    if nombre is None:
+        return
+    with _lock:
+        _cache.pop(nombre, None)
+        _filas_por_ciclo.pop(nombre, None)
+        _generacion += 1
+
+
+def _escanear_tabla(db: Session, tabla: str):
+    """Carga y escanea una tabla completa: (hallazgos por ciclo, filas por ciclo)."""
+    modelo = TABLAS_CALIDAD[tabla]
+    datos = _cargar_tabla(db, modelo)
+    ciclos, conteos = np.unique(datos["ciclo"].astype(str), return_counts=True)
+    por_ciclo: Dict[str, List[dict]] = {ciclo: [] for ciclo in ciclos.tolist()}
+    for h in _escanear(tabla, modelo, datos):
+        por_ciclo[h["ciclo"]].append(h)
+    return por_ciclo, dict(zip(ciclos.tolist(), conteos.tolist()))
+
+
+def escanear(
+    db: Session, tablas: Optional[List[str]] = None, ciclo: Optional[str] = None
+) -> dict:
+    """
+    Devuelve los hallazgos de calidad de las tablas pedidas (todas por defecto),
+    limitados a un ciclo si se indica. Solo se vuelve a leer la BD si una
+    escritura invalidó la caché de la tabla.
+    """
+    clean_ciclo = ciclo.strip().upper() if ciclo else None
+    # El escaneo lee la BD directamente: primero se vuelcan los PUT diferidos
+    crud_escritura_diferida.vaciar()
+    hallazgos: List[dict] = []
+    filas = 0
+    for tabla in tablas or list(TABLAS_CALIDAD):
+        with _lock:
+            por_ciclo = _cache.get(tabla)
+            conteos = _filas_por_ciclo.get(tabla)
+            generacion = _generacion
+        if por_ciclo is None:
+            por_ciclo, conteos = _escanear_tabla(db, tabla)
+            with _lock:
+                # Si hubo una escritura durante el escaneo el resultado se usa, no se guarda
+                if _generacion == generacion:
+                    _cache[tabla] = por_ciclo
+                    _filas_por_ciclo[tabla] = conteos
+        if clean_ciclo:
+            hallazgos.extend(por_ciclo.get(clean_ciclo, []))
+            filas += conteos.get(clean_ciclo, 0)
+        else:
+            for lista in por_ciclo.values():
+                hallazgos.extend(lista)
+            filas += sum(conteos.values())
+    return {"ciclo": clean_ciclo, "filas_escaneadas": filas, "hallazgos": hallazgos}
+
+
+def validar_entrada(modelo, entrada) -> List[dict]:
+    """
+    Reglas de rango y de pesos para una sola entrada (costo constante), usadas en
+    el PUT cuando settings.CALIDAD_VALIDAR_EN_PUT está activo. Los atípicos
+    estadísticos no se validan aquí: dependen de toda la historia.
+    """
+    tabla = _NOMBRE_CORTO[modelo.__tablename__]
+    muestra = getattr(entrada, "muestra", None)
+    hallazgos = []
+    for campo in _campos(modelo):
+        valor = getattr(entrada, campo)
+        if valor is None:
+            continue
+        inferior, superior = RANGOS[campo]
+        if (inferior is not None and valor < inferior) or (
+            superior is not None and valor > superior
+        ):
+            hallazgos.append(
+                _hallazgo(
+                    tabla,
+                    entrada.key,
+                    entrada.ciclo,
+                    entrada.origen,
+                    muestra,
+                    campo,
+                    valor,
+                    "rango",
+                    _detalle_rango(campo),
+                )
+            )
+    if (
+        entrada.p1h1 is not None
+        and entrada.p2h2 is not None
+        and entrada.p2h2 > entrada.p1h1
+    ):
+        hallazgos.append(
+            _hallazgo(
+                tabla,
+                entrada.key,
+                entrada.ciclo,
+                entrada.origen,
+                muestra,
+                "p2h2",
+                entrada.p2h2,
+                "pesos",
+                f"p2h2 ({entrada.p2h2}) mayor que p1h1 ({entrada.p1h1})",
+            )
+        )
+    return hallazgos
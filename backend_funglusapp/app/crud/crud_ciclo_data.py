@@ -1,8 +1,8 @@
 # backend_funglusapp/app/crud/crud_ciclo_data.py
 from typing import List
 
+from app.crud import crud_archivo
 from app.db import models
-from sqlalchemy import distinct
 from sqlalchemy.orm import Session
 
 # La lógica de get_or_create_placeholder ahora está dentro de los CRUDs específicos
@@ -22,8 +22,10 @@ def get_distinct_ciclos(db: Session) -> List[str]:
     Puedes cambiar la tabla de referencia si otra es más apropiada.
     """
     results = (
-        db.query(distinct(models.MateriaPrima.ciclo))
-        .order_by(models.MateriaPrima.ciclo.desc())
+        db.query(models.DimCiclo.valor)
+        .join(models.MateriaPrima, models.MateriaPrima.ciclo_id == models.DimCiclo.id)
+        .distinct()
+        .order_by(models.DimCiclo.valor.desc())
         .all()
     )
     # Alternativamente, si quieres ciclos de cualquier tabla de laboratorio:
@@ -32,4 +34,9 @@ def get_distinct_ciclos(db: Session) -> List[str]:
     # ciclos_th = set(r[0] for r in db.query(distinct(models.TamoHumedo.ciclo)).all() if r[0])
     # all_distinct_ciclos = sorted(list(ciclos_mp.union(ciclos_gubys).union(ciclos_th)), reverse=True)
     # return all_distinct_ciclos
-    return [result[0] for result in results if result[0]]
+    ciclos = [result[0] for result in results if result[0]]
+    # Los ciclos archivados ya no están en la tabla activa, pero siguen existiendo
+    archivados = [r.ciclo for r in crud_archivo.get_ciclos_archivados(db)]
+    if archivados:
+        ciclos = sorted(set(ciclos).union(archivados), reverse=True)
+    return ciclos
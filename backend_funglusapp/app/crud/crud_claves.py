@@ -0,0 +1,294 @@
+# backend_funglusapp/app/crud/crud_claves.py
+import heapq
+import sys
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from app.core import eventos
+from app.crud import crud_archivo
+from app.db import database, dimensiones, models
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+# Índice en memoria para autocompletar origen/muestra. Por cada (tabla, campo) hay
+# un arreglo ordenado de valores distintos (búsqueda por prefijo con bisect) y un
+# índice más pequeño por ciclo. El ranking es el número de ciclos en que aparece
+# el valor (más usado primero) y luego orden alfabético.
+# Se construye al arrancar y los CRUD lo actualizan con eventos.notificar_escritura.
+# Si queda obsoleto (eventos.TODAS) se reconstruye en un hilo aparte, uno a la vez,
+# y mientras tanto las consultas siguen usando el índice anterior.
+
+TABLAS_CLAVES = {
+    "materia_prima": (models.MateriaPrima, ("origen", "muestra")),
+    "gubys": (models.Gubys, ("origen",)),
+    "tamo_humedo": (models.TamoHumedo, ("origen",)),
+}
+MAX_SUGERENCIAS = 50
+# Rangos de prefijo más grandes que esto usan el top memorizado en vez de recorrerse
+UMBRAL_MEMO = 256
+# Al construir se precalcula el top de los prefijos de hasta este largo (los rangos
+# más grandes), para que ni la primera consulta tenga que recorrerlos.
+LARGO_PRECALCULO = 2
+
+
+class _ListaPrefijos:
+    def __init__(self):
+        self.valores: List[str] = []  # Ordenados
+        self.conteos: Dict[str, int] = {}
+        # prefijo -> top MAX_SUGERENCIAS [(-conteo, valor)], solo para rangos grandes
+        self._memo: Dict[str, List[Tuple[int, str]]] = {}
+
+    def incrementar(self, valor: str) -> None:
+        conteo = self.conteos.get(valor)
+        if conteo is None:
+            insort(self.valores, valor)
+            conteo = 0
+        conteo += 1
+        self.conteos[valor] = conteo
+        # Los conteos solo crecen, así que cada top memorizado se puede corregir
+        # en su sitio sin volver a recorrer el rango.
+        for largo in range(len(valor) + 1):
+            top = self._memo.get(valor[:largo])
+            if top is None:
+                continue
+            top[:] = [(c, v) for c, v in top if v != valor]
+            insort(top, (-conteo, valor))
+            del top[MAX_SUGERENCIAS:]
+
+    def precalcular(self) -> None:
+        if len(self.valores) <= UMBRAL_MEMO:
+            return
+        # self.valores está en orden alfabético y sorted es estable (también con
+        # reverse): los empates quedan en orden alfabético, igual que en buscar()
+        por_conteo = sorted(self.valores, key=self.conteos.__getitem__, reverse=True)
+        memo: Dict[str, List[Tuple[int, str]]] = {}
+        for largo in range(LARGO_PRECALCULO + 1):
+            con_largo = [v for v in por_conteo if len(v) >= largo]
+            # Se corta en cuanto todos los prefijos de este largo tienen su top lleno
+            pendientes = len({v[:largo] for v in con_largo})
+            for valor in con_largo:
+                top = memo.setdefault(valor[:largo], [])
+                if len(top) < MAX_SUGERENCIAS:
+                    top.append((-self.conteos[valor], valor))
+                    if len(top) == MAX_SUGERENCIAS:
+                        pendientes -= 1
+                        if pendientes == 0:
+                            break
+        self._memo = memo
+
+    def _rango(self, prefijo: str) -> Tuple[int, int]:
+        inicio = bisect_left(self.valores, prefijo)
+        fin = bisect_left(self.valores, prefijo + "\U0010ffff", inicio)
+        return inicio, fin
+
+    def buscar(self, prefijo: str, limite: int) -> List[Tuple[str, int]]:
+        top = self._memo.get(prefijo)
+        if top is None:
+            inicio, fin = self._rango(prefijo)
+            top = heapq.nsmallest(
+                MAX_SUGERENCIAS,
+                ((-self.conteos[v], v) for v in self.valores[inicio:fin]),
+            )
+            if fin - inicio > UMBRAL_MEMO:
+                self._memo[prefijo] = top
+        return [(valor, -conteo) for conteo, valor in top[:limite]]
+
+    def bytes_aproximados(self) -> int:
+        total = sys.getsizeof(self.valores) + sys.getsizeof(self.conteos)
+        total += sum(sys.getsizeof(v) for v in self.valores)
+        total += sum(sys.getsizeof(top) for top in self._memo.values())
+        return total
+
+
+class IndiceClaves:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tablas: Dict[Tuple[str, str], _ListaPrefijos] = {}
+        self._ciclos: Dict[Tuple[str, str, str], _ListaPrefijos] = {}
+        self.obsoleto = True
+        self.construido = False
+        self._version = 0  # Sube con cada marcar_obsoleto()
+        self._lock_construccion = threading.Lock()  # Una construcción a la vez
+        self._hilo: Optional[threading.Thread] = None
+        # Escrituras que llegan mientras se reconstruye: se aplican al terminar
+        self._durante_construccion: Optional[list] = None
+
+    def marcar_obsoleto(self) -> None:
+        with self._lock:
+            self._version += 1
+            self.obsoleto = True
+
+    def _agregar(self, tabla: str, campo: str, ciclo: str, valor: str) -> None:
+        por_ciclo = self._ciclos.setdefault((tabla, campo, ciclo), _ListaPrefijos())
+        if valor in por_ciclo.conteos:
+            return  # Idempotente: el mismo valor en el mismo ciclo cuenta una vez
+        por_ciclo.incrementar(valor)
+        self._tablas.setdefault((tabla, campo), _ListaPrefijos()).incrementar(valor)
+
+    def _cargar(self, db: Session):
+        """Lee las claves activas y archivadas y arma los índices nuevos (sin lock)."""
+        tablas: Dict[Tuple[str, str], _ListaPrefijos] = {}
+        ciclos: Dict[Tuple[str, str, str], _ListaPrefijos] = {}
+        for tabla, (modelo, campos) in TABLAS_CLAVES.items():
+            for campo in campos:
+                ids = (
+                    db.connection()
+                    .execute(
+                        select(
+                            modelo.ciclo_id, getattr(modelo, f"{campo}_id")
+                        ).distinct()
+                    )
+                    .fetchall()
+                )
+                ciclos_ids, valores_ids = zip(*ids) if ids else ((), ())
+                pares = set(
+                    zip(
+                        dimensiones.obtener_valores(models.DimCiclo, ciclos_ids),
+                        dimensiones.obtener_valores(
+                            models.DIMENSIONES[campo], valores_ids
+                        ),
+                    )
+                )
+                pares.update(
+                    (fila.ciclo, getattr(fila, campo))
+                    for fila in crud_archivo.get_filas_archivadas(
+                        db, modelo.__tablename__
+                    )
+                )
+                # Carga masiva: se ordena una sola vez en lugar de insertar uno a uno
+                indice_tabla = tablas.setdefault((tabla, campo), _ListaPrefijos())
+                for ciclo, valor in pares:
+                    if not valor:
+                        continue
+                    por_ciclo = ciclos.setdefault(
+                        (tabla, campo, ciclo), _ListaPrefijos()
+                    )
+                    por_ciclo.conteos[valor] = 1
+                    indice_tabla.conteos[valor] = indice_tabla.conteos.get(valor, 0) + 1
+        for lista in list(tablas.values()) + list(ciclos.values()):
+            lista.valores = sorted(lista.conteos)
+            lista.precalcular()
+        return tablas, ciclos
+
+    def construir(self, db: Session) -> None:
+        with self._lock_construccion:
+            with self._lock:
+                if not self.obsoleto:
+                    return  # Otro hilo lo acaba de construir
+                version = self._version
+                self._durante_construccion = []
+            try:
+                tablas, ciclos = self._cargar(db)
+            except Exception:
+                with self._lock:
+                    self._durante_construccion = None
+                raise
+            with self._lock:
+                self._tablas, self._ciclos = tablas, ciclos
+                # Si llegó otro marcar_obsoleto() mientras se construía, sigue obsoleto
+                self.obsoleto = self._version != version
+                self.construido = True
+                for args in self._durante_construccion:
+                    self._agregar(*args)
+                self._durante_construccion = None
+
+    def reconstruir_en_segundo_plano(self) -> None:
+        """Lanza la reconstrucción en otro hilo, salvo que ya haya una en curso."""
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._hilo = threading.Thread(
+                target=self._reconstruir, name="indice-claves", daemon=True
+            )
+            self._hilo.start()
+
+    def _reconstruir(self) -> None:
+        while self.obsoleto:
+            db = database.SessionLocal()
+            try:
+                self.construir(db)
+            except Exception as e:
+                print(f"CRUD Claves: ERROR al reconstruir el índice: {e}")
+                return
+            finally:
+                db.close()
+        print(f"INFO:     Índice de claves reconstruido: {self.estadisticas()}")
+
+    def registrar(
+        self, tabla: str, ciclo: str, origen: Optional[str], muestra: Optional[str]
+    ) -> None:
+        with self._lock:
+            for campo, valor in (("origen", origen), ("muestra", muestra)):
+                if not valor:
+                    continue
+                self._agregar(tabla, campo, ciclo, valor)
+                if self._durante_construccion is not None:
+                    self._durante_construccion.append((tabla, campo, ciclo, valor))
+
+    def sugerir(
+        self,
+        tabla: str,
+        campo: str,
+        prefijo: str,
+        ciclo: Optional[str] = None,
+        limite: int = 10,
+    ) -> List[Tuple[str, int]]:
+        clave = (tabla, campo, ciclo) if ciclo else (tabla, campo)
+        with self._lock:
+            lista = (self._ciclos if ciclo else self._tablas).get(clave)
+            if lista is None:
+                return []
+            return lista.buscar(prefijo, limite)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            listas = list(self._tablas.values()) + list(self._ciclos.values())
+            return {
+                "valores_por_tabla": {
+                    f"{tabla}.{campo}": len(lista.valores)
+                    for (tabla, campo), lista in self._tablas.items()
+                },
+                "indices_por_ciclo": len(self._ciclos),
+                "bytes_aproximados": sum(l.bytes_aproximados() for l in listas),
+            }
+
+
+indice = IndiceClaves()
+_NOMBRE_CORTO = {
+    modelo.__tablename__: nombre for nombre, (modelo, _) in TABLAS_CLAVES.items()
+}
+
+
+@eventos.registrar_oyente
+def _registrar_claves(tabla: str, ciclo, origen=None, muestra=None) -> None:
+    if tabla == eventos.TODAS:
+        indice.marcar_obsoleto()
+        return
+    nombre = _NOMBRE_CORTO.get(tabla)
+    if nombre is not None and ciclo and (origen or muestra):
+        indice.registrar(nombre, ciclo, origen, muestra)
+
+
+def construir_indice(db: Session) -> None:
+    indice.construir(db)
+    print(f"INFO:     Índice de claves construido: {indice.estadisticas()}")
+
+
+def sugerir_claves(
+    db: Session,
+    tabla: str,
+    campo: str,
+    prefijo: str = "",
+    ciclo: Optional[str] = None,
+    limite: int = 10,
+) -> List[Tuple[str, int]]:
+    if indice.obsoleto:
+        if indice.construido:
+            indice.reconstruir_en_segundo_plano()
+        else:
+            indice.construir(db)  # Aún no hay un índice anterior que servir
+    clean_ciclo = ciclo.strip().upper() if ciclo else None
+    return indice.sugerir(
+        tabla, campo, prefijo.strip().upper(), clean_ciclo, min(limite, MAX_SUGERENCIAS)
+    )
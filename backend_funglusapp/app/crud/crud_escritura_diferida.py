@@ -0,0 +1,433 @@
+# backend_funglusapp/app/crud/crud_escritura_diferida.py
+import glob
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from app.core import eventos
+from app.core.config import settings
+from app.crud import crud_cache_eventos
+from app.db import database, models
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+# Escritura diferida (settings.ESCRITURA_DIFERIDA) para los PUT .../entry de los
+# formularios de laboratorio, que guardan la fila completa cada vez que el usuario
+# cambia de campo. En lugar de un commit por PUT:
+#   1. Los cambios se acumulan por fila en memoria (el último valor de cada campo gana).
+#   2. Cada PUT se añade a un diario (JSON por línea) y se sincroniza con fsync
+#      antes de responder; varios PUT simultáneos comparten el mismo fsync.
+#   3. Un hilo vuelca todo lo pendiente a SQLite en una sola transacción cada
+#      ESCRITURA_DIFERIDA_INTERVALO segundos (o antes si hay demasiadas filas).
+#   4. Al arrancar se reaplica el diario que haya quedado de una caída (sin escritura
+#      diferida activada, si no se puede volcar el arranque falla y el diario se queda).
+# Las lecturas de los CRUD superponen los cambios pendientes (superponer()), y los
+# procesos que leen la BD directamente (archivo, calidad, formulación, jobs)
+# llaman antes a vaciar(). Mientras se archiva un ciclo (ciclo_bloqueado()) sus PUT
+# se rechazan. Un cambio cuya fila ya no existe al volcarlo no se descarta: se
+# guarda en el archivo "<diario>.sin_fila" y se avisa como error.
+
+TABLAS = {
+    modelo.__tablename__: modelo
+    for modelo in (models.MateriaPrima, models.Gubys, models.TamoHumedo)
+}
+CAMPOS_CALCULADOS = ("hprom", "dprom")
+
+
+class _Pendiente:
+    __slots__ = ("tabla", "key", "ciclo", "origen", "muestra", "cambios")
+
+    def __init__(self, registro: dict):
+        self.tabla = registro["tabla"]
+        self.key = registro["key"]
+        self.ciclo = registro["ciclo"]
+        self.origen = registro["origen"]
+        self.muestra = registro.get("muestra")
+        self.cambios = dict(registro["cambios"])
+
+
+class _Diario:
+    """Archivo de solo añadir con fsync agrupado (group commit)."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.fsyncs = 0
+        self._lock_fsync = threading.Lock()
+        self._generacion = 0
+        self._escrito = 0
+        self._sincronizado = 0
+        self._abrir()
+
+    def _abrir(self) -> None:
+        nuevo = not os.path.exists(self.ruta)
+        self._archivo = open(self.ruta, "a", encoding="utf-8")
+        self._escrito = self._sincronizado = self._archivo.tell()
+        if nuevo:
+            _sincronizar_directorio(self.ruta)
+
+    def escribir(self, linea: str) -> Tuple[int, int]:
+        # Se llama con el lock del módulo tomado: el orden del diario es el de la memoria
+        self._archivo.write(linea + "\n")
+        self._archivo.flush()
+        self._escrito = self._archivo.tell()
+        return self._generacion, self._escrito
+
+    def sincronizar(self, marca: Tuple[int, int]) -> None:
+        generacion, posicion = marca
+        with self._lock_fsync:
+            if generacion != self._generacion or posicion <= self._sincronizado:
+                return  # Otro PUT (o la rotación) ya lo llevó a disco
+            hasta = self._escrito
+            os.fsync(self._archivo.fileno())
+            self.fsyncs += 1
+            self._sincronizado = hasta
+
+    def rotar(self, destino: str) -> None:
+        """Cierra el diario actual (ya sincronizado) como `destino` y abre uno vacío."""
+        with self._lock_fsync:
+            self._archivo.flush()
+            os.fsync(self._archivo.fileno())
+            self.fsyncs += 1
+            self._archivo.close()
+            os.replace(self.ruta, destino)
+            self._generacion += 1
+            self._abrir()
+
+    def cerrar(self) -> None:
+        self._archivo.close()
+
+
+def _sincronizar_directorio(ruta: str) -> None:
+    # Sin esto, un archivo recién creado o renombrado puede desaparecer tras una caída
+    descriptor = os.open(os.path.dirname(os.path.abspath(ruta)), os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+_pendientes: Dict[Tuple[str, int], _Pendiente] = {}
+# Lote que se está escribiendo en SQLite: sigue visible para las lecturas hasta el commit
+_en_vaciado: Dict[Tuple[str, int], _Pendiente] = {}
+_lock = threading.Lock()
+_lock_vaciado = threading.Lock()
+_diario: Optional[_Diario] = None
+_rotados: List[str] = []  # Diarios ya cerrados cuyo contenido aún no está en SQLite
+_siguiente_rotado = 0
+_hilo: Optional[threading.Thread] = None
+# Proceso dueño del diario: un proceso hijo creado con fork hereda este módulo tal
+# cual (diario abierto, pendientes, locks) y no debe tocar nada de eso
+_pid_diario: Optional[int] = None
+_ciclos_bloqueados: Dict[str, int] = {}  # ciclo -> archivados en curso
+_despertar = threading.Event()
+_detener = threading.Event()
+
+
+def _acumular(registro: dict) -> None:
+    clave = (registro["tabla"], registro["key"])
+    pendiente = _pendientes.get(clave)
+    if pendiente is None:
+        _pendientes[clave] = _Pendiente(registro)
+    else:
+        pendiente.cambios.update(registro["cambios"])
+
+
+def _numero_rotado(ruta: str) -> int:
+    sufijo = ruta.rsplit(".", 1)[-1]
+    return int(sufijo) if sufijo.isdigit() else -1
+
+
+def _recuperar(ruta: str) -> int:
+    registros = 0
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:
+                # Línea cortada por una caída a mitad de escritura: ese PUT nunca se confirmó
+                break
+            _acumular(registro)
+            registros += 1
+    return registros
+
+
+def _propio() -> bool:
+    return _pid_diario == os.getpid()
+
+
+def activo() -> bool:
+    return _diario is not None and _propio()
+
+
+def iniciar() -> None:
+    """
+    Reaplica los diarios que haya dejado una caída y, si la escritura diferida está
+    activada, abre el diario y arranca el hilo que vuelca a SQLite. Desactivada,
+    lanza RuntimeError si lo recuperado no llega a la BD; los diarios solo se
+    borran tras volcarlo.
+    """
+    global _diario, _hilo, _siguiente_rotado, _pid_diario
+    if settings.ESCRITURA_DIFERIDA and settings.WORKERS > 1:
+        # Cada worker tendría su propio buffer (los demás leerían datos viejos) y
+        # todos escribirían el mismo diario
+        raise RuntimeError(
+            "ESCRITURA_DIFERIDA no es compatible con WORKERS > 1; desactiva una de las dos."
+        )
+    ruta = settings.ESCRITURA_DIFERIDA_DIARIO
+    rotados = sorted(
+        (r for r in glob.glob(ruta + ".*") if _numero_rotado(r) >= 0),
+        key=_numero_rotado,
+    )
+    if not settings.ESCRITURA_DIFERIDA and not rotados and not os.path.exists(ruta):
+        return
+    with _lock:
+        if activo():
+            return
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        recuperados = sum(_recuperar(r) for r in rotados)
+        if os.path.exists(ruta):
+            recuperados += _recuperar(ruta)
+        _rotados.extend(rotados)
+        _siguiente_rotado = max([_numero_rotado(r) for r in rotados], default=-1) + 1
+        _diario = _Diario(ruta)
+        _pid_diario = os.getpid()
+    if recuperados:
+        print(
+            f"INFO:     Escritura diferida: {recuperados} cambios recuperados del diario."
+        )
+        vaciar()
+
+    if not settings.ESCRITURA_DIFERIDA:
+        # Solo hacía falta recuperar: se vuelve al modo normal sin diario
+        detener()
+        with _lock:
+            sin_volcar = len(_pendientes)
+            _pendientes.clear()
+            rotados = list(_rotados)
+            _rotados.clear()
+        if sin_volcar:
+            # Los diarios se quedan en disco y este proceso no arranca: si arrancara,
+            # sus escrituras directas quedarían pisadas por el diario en el próximo
+            # arranque; si se borraran, se perderían cambios confirmados.
+            raise RuntimeError(
+                f"Escritura diferida: no se pudieron volcar a la BD {sin_volcar} "
+                f"cambios recuperados del diario '{ruta}' (ver el error anterior). "
+                "Los diarios se conservan y se reaplicarán en el próximo arranque."
+            )
+        for rotado in rotados:
+            os.remove(rotado)
+        os.remove(ruta)
+        return
+    _detener.clear()
+    _hilo = threading.Thread(target=_bucle, name="escritura-diferida", daemon=True)
+    _hilo.start()
+    print(
+        f"INFO:     Escritura diferida activa (cada {settings.ESCRITURA_DIFERIDA_INTERVALO}s "
+        f"o {settings.ESCRITURA_DIFERIDA_MAX_PENDIENTES} filas, diario '{ruta}')."
+    )
+
+
+def detener() -> None:
+    """Vuelca lo pendiente y cierra el diario."""
+    global _diario, _hilo
+    if _diario is not None and not _propio():
+        return
+    _detener.set()
+    _despertar.set()
+    if _hilo is not None:
+        _hilo.join()
+        _hilo = None
+    if _diario is None:
+        return
+    vaciar()
+    with _lock:
+        _diario.cerrar()
+        _diario = None
+
+
+def _bucle() -> None:
+    while not _detener.is_set():
+        _despertar.wait(settings.ESCRITURA_DIFERIDA_INTERVALO)
+        _despertar.clear()
+        try:
+            vaciar()
+        except Exception as e:
+            print(f"CRUD EscrituraDiferida: ERROR inesperado al vaciar: {e}")
+
+
+def encolar(
+    db: Session,
+    modelo,
+    db_entry,
+    update_data: dict,
+    ciclo: str,
+    origen: str,
+    muestra: Optional[str] = None,
+) -> None:
+    """
+    Registra los campos del PUT (más los promedios ya recalculados en `db_entry`)
+    como cambios pendientes de la fila. Vuelve cuando el cambio está en el diario
+    en disco; `db_entry` queda fuera de la sesión con los valores nuevos.
+    """
+    if not activo():
+        iniciar()
+    campos = list(update_data) + [c for c in CAMPOS_CALCULADOS if hasattr(modelo, c)]
+    registro = {
+        "tabla": modelo.__tablename__,
+        "key": db_entry.key,
+        "ciclo": ciclo,
+        "origen": origen,
+        "muestra": muestra,
+        "cambios": {campo: getattr(db_entry, campo) for campo in campos},
+    }
+    if db_entry in db:
+        # Que ningún commit posterior de la sesión escriba la fila por su cuenta
+        db.expunge(db_entry)
+    with _lock:
+        if ciclo in _ciclos_bloqueados:
+            from app.crud.crud_archivo import CicloArchivadoError
+
+            raise CicloArchivadoError(ciclo)
+        _acumular(registro)
+        marca = _diario.escribir(json.dumps(registro))
+        diario = _diario
+        lleno = len(_pendientes) >= settings.ESCRITURA_DIFERIDA_MAX_PENDIENTES
+    diario.sincronizar(marca)
+    if lleno:
+        _despertar.set()
+
+
+def superponer(db: Session, fila):
+    """Devuelve la fila con los cambios aún no volcados a SQLite (si los hay)."""
+    if (not _pendientes and not _en_vaciado) or not _propio():
+        return fila
+    clave = (getattr(type(fila), "__tablename__", None), fila.key)
+    with _lock:
+        cambios = {}
+        for origen in (_en_vaciado, _pendientes):
+            pendiente = origen.get(clave)
+            if pendiente is not None:
+                cambios.update(pendiente.cambios)
+    if not cambios:
+        return fila
+    if fila in db:
+        db.expunge(fila)
+    for campo, valor in cambios.items():
+        setattr(fila, campo, valor)
+    return fila
+
+
+def _guardar_sin_fila(pendientes: List[_Pendiente]) -> None:
+    ruta = _diario.ruta + ".sin_fila"
+    with open(ruta, "a", encoding="utf-8") as f:
+        for p in pendientes:
+            registro = {campo: getattr(p, campo) for campo in _Pendiente.__slots__}
+            f.write(json.dumps(registro) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    _sincronizar_directorio(ruta)
+    print(
+        f"CRUD EscrituraDiferida: ERROR - {len(pendientes)} cambios confirmados no "
+        f"encontraron su fila (¿ciclo archivado o borrado?); guardados en '{ruta}'"
+    )
+
+
+def bloquear_ciclo(ciclo: str) -> None:
+    """A partir de aquí los PUT diferidos del ciclo (limpio) fallan con 409."""
+    with _lock:
+        _ciclos_bloqueados[ciclo] = _ciclos_bloqueados.get(ciclo, 0) + 1
+
+
+def desbloquear_ciclo(ciclo: str) -> None:
+    with _lock:
+        restantes = _ciclos_bloqueados.pop(ciclo, 1) - 1
+        if restantes > 0:
+            _ciclos_bloqueados[ciclo] = restantes
+
+
+@contextmanager
+def ciclo_bloqueado(ciclo: str):
+    """
+    Para archivar un ciclo: rechaza sus PUT diferidos mientras dure y, ya con el
+    bloqueo puesto, vuelca lo pendiente para que quede dentro del archivo.
+    """
+    bloquear_ciclo(ciclo)
+    try:
+        vaciar()
+        yield
+    finally:
+        desbloquear_ciclo(ciclo)
+
+
+def vaciar() -> int:
+    """Escribe todos los cambios pendientes en una transacción. Devuelve las filas."""
+    global _siguiente_rotado
+    if not activo():
+        return 0
+    with _lock_vaciado:
+        with _lock:
+            if not _pendientes or _diario is None:
+                return 0
+            lote = dict(_pendientes)
+            _pendientes.clear()
+            _en_vaciado.update(lote)
+            # Lo que llegue a partir de aquí va a un diario nuevo
+            rotado = f"{_diario.ruta}.{_siguiente_rotado}"
+            _siguiente_rotado += 1
+            _diario.rotar(rotado)
+            _rotados.append(rotado)
+
+        sin_fila = []
+        try:
+            with database.engine.begin() as conexion:
+                for pendiente in lote.values():
+                    tabla = TABLAS[pendiente.tabla].__table__
+                    resultado = conexion.execute(
+                        update(tabla)
+                        .where(tabla.c.key == pendiente.key)
+                        .values(**pendiente.cambios)
+                    )
+                    if resultado.rowcount == 0:
+                        sin_fila.append(pendiente)
+                    else:
+                        crud_cache_eventos.publicar(
+                            conexion,
+                            pendiente.tabla,
+                            pendiente.ciclo,
+                            pendiente.origen,
+                            pendiente.muestra,
+                        )
+            if sin_fila:
+                # Antes de borrar los diarios: estos cambios solo existen ahí
+                _guardar_sin_fila(sin_fila)
+        except Exception as e:
+            with _lock:
+                # Se devuelven a la cola por debajo de lo que haya llegado mientras tanto
+                for clave, pendiente in lote.items():
+                    posterior = _pendientes.get(clave)
+                    if posterior is not None:
+                        pendiente.cambios.update(posterior.cambios)
+                    _pendientes[clave] = pendiente
+                _en_vaciado.clear()
+            print(
+                f"CRUD EscrituraDiferida: ERROR al volcar {len(lote)} filas, se reintentará: {e}"
+            )
+            return 0
+
+        with _lock:
+            _en_vaciado.clear()
+            rotados = list(_rotados)
+            _rotados.clear()
+        for ruta in rotados:
+            os.remove(ruta)
+
+    avisados = set()
+    for p in lote.values():
+        aviso = (p.tabla, p.ciclo, p.origen, p.muestra)
+        if aviso not in avisados:
+            avisados.add(aviso)
+            eventos.notificar_escritura(*aviso)
+    print(f"CRUD EscrituraDiferida: {len(lote)} filas volcadas a la BD")
+    return len(lote)
@@ -0,0 +1,287 @@
+# backend_funglusapp/app/crud/crud_formulacion.py
+import threading
+from itertools import combinations, islice
+from math import comb
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from app.core import eventos, pool
+from app.core.config import settings
+from app.crud import crud_archivo, crud_escritura_diferida
+from app.db import dimensiones, models
+from app.schemas import formulacion_schemas as schemas
+from sqlalchemy.orm import Session
+
+# Motor de formulación: a partir de la humedad (hprom) y el pH medidos en el ciclo
+# busca las proporciones de ingredientes que acercan la mezcla a la humedad y el
+# pH objetivo. Se evalúan todas las recetas de una rejilla sobre el simplex
+# (proporciones múltiplo de `paso` que suman 1) con álgebra matricial:
+#   humedad = R @ hprom,  ph = R @ ph
+# El pH de la mezcla se aproxima como promedio ponderado por masa; es una
+# estimación para planificar, no un modelo químico.
+
+AGUA = {"nombre": "AGUA", "hprom": 100.0, "ph": 7.0, "filas": 0}
+TAMO_HUMEDO = "TAMO_HUMEDO"
+MAX_CANDIDATOS = 5_000_000
+TAMANO_LOTE = 250_000
+MAX_CACHE_POR_CICLO = 32  # Conjuntos de parámetros distintos guardados por ciclo
+
+
+class FormulacionError(ValueError):
+    """Los datos del ciclo o los parámetros no permiten formular."""
+
+
+def _promedio(valores: List[Optional[float]]) -> Optional[float]:
+    validos = [v for v in valores if v is not None]
+    return round(sum(validos) / len(validos), 3) if validos else None
+
+
+def _filas_ciclo(db: Session, modelo, ciclo: str) -> list:
+    if crud_archivo.get_ciclo_archivado(db, ciclo):
+        return crud_archivo.get_filas_archivadas(db, modelo.__tablename__, ciclo)
+    ciclo_id = dimensiones.obtener_id(models.DimCiclo, ciclo)
+    if ciclo_id is None:
+        return []
+    return db.query(modelo).filter(modelo.ciclo_id == ciclo_id).all()
+
+
+def get_ingredientes_ciclo(db: Session, ciclo: str) -> List[dict]:
+    """
+    Ingredientes disponibles en el ciclo: cada muestra de Materia Prima (promedio
+    de sus orígenes) y el Tamo Húmedo. Solo se incluyen los que tienen hprom y pH.
+    """
+    agrupados: Dict[str, list] = {}
+    for fila in _filas_ciclo(db, models.MateriaPrima, ciclo):
+        agrupados.setdefault(fila.muestra, []).append(fila)
+    tamo_humedo = _filas_ciclo(db, models.TamoHumedo, ciclo)
+    if tamo_humedo:
+        agrupados[TAMO_HUMEDO] = tamo_humedo
+
+    ingredientes = []
+    for nombre, filas in sorted(agrupados.items()):
+        hprom = _promedio([f.hprom for f in filas])
+        ph = _promedio([f.ph for f in filas])
+        if hprom is None or ph is None:
+            print(
+                f"CRUD Formulacion: '{nombre}' del ciclo '{ciclo}' sin hprom/pH, se omite."
+            )
+            continue
+        ingredientes.append(
+            {"nombre": nombre, "hprom": hprom, "ph": ph, "filas": len(filas)}
+        )
+    return ingredientes
+
+
+def contar_candidatos(n_ingredientes: int, paso: float) -> int:
+    divisiones = round(1 / paso)
+    return comb(divisiones + n_ingredientes - 1, n_ingredientes - 1)
+
+
+def _lotes_simplex(n: int, divisiones: int):
+    """
+    Genera por lotes todas las composiciones de `divisiones` en `n` partes
+    (método de barras y estrellas), como matrices de proporciones que suman 1.
+    """
+    posiciones = combinations(range(divisiones + n - 1), n - 1)
+    while True:
+        barras = np.array(list(islice(posiciones, TAMANO_LOTE)), dtype=np.int32)
+        if barras.size == 0:
+            return
+        barras = barras.reshape(-1, n - 1)
+        bordes = np.hstack(
+            [
+                np.full((len(barras), 1), -1, dtype=np.int32),
+                barras,
+                np.full((len(barras), 1), divisiones + n - 1, dtype=np.int32),
+            ]
+        )
+        yield (np.diff(bordes, axis=1) - 1) / divisiones
+
+
+def resolver_recetas(
+    hprom: List[float],
+    ph: List[float],
+    humedad_objetivo: float,
+    ph_objetivo: float,
+    paso: float,
+    minimos: List[float],
+    maximos: List[float],
+    tolerancia_humedad: float,
+    tolerancia_ph: float,
+    top: int,
+    avance: Optional[Callable[[float], None]] = None,
+) -> Tuple[int, List[Tuple[List[float], float, float, float]]]:
+    """
+    Evalúa todas las recetas de la rejilla y devuelve (evaluadas, mejores), donde
+    cada receta es (proporciones, humedad, ph, error). Función pura y picklable
+    para poder ejecutarse en el pool de procesos. `avance` recibe la fracción
+    procesada tras cada lote (los jobs la usan para reportar progreso y cancelar).
+    """
+    h = np.asarray(hprom, dtype=float)
+    p = np.asarray(ph, dtype=float)
+    minimos_arr = np.asarray(minimos, dtype=float)
+    maximos_arr = np.asarray(maximos, dtype=float)
+    mejores_r = np.empty((0, len(h)))
+    mejores_error = np.empty(0)
+    evaluadas = 0
+    total = contar_candidatos(len(h), paso)
+    procesadas = 0
+
+    for recetas in _lotes_simplex(len(h), round(1 / paso)):
+        procesadas += len(recetas)
+        if avance is not None:
+            avance(procesadas / total)
+        dentro = np.all(
+            (recetas >= minimos_arr - 1e-9) & (recetas <= maximos_arr + 1e-9), axis=1
+        )
+        recetas = recetas[dentro]
+        evaluadas += len(recetas)
+        if len(recetas) == 0:
+            continue
+        error = ((recetas @ h - humedad_objetivo) / tolerancia_humedad) ** 2 + (
+            (recetas @ p - ph_objetivo) / tolerancia_ph
+        ) ** 2
+        # Nos quedamos solo con el top del lote y lo unimos al top acumulado
+        if len(error) > top:
+            indices = np.argpartition(error, top)[:top]
+            recetas, error = recetas[indices], error[indices]
+        mejores_r = np.vstack([mejores_r, recetas])
+        mejores_error = np.concatenate([mejores_error, error])
+        orden = np.argsort(mejores_error, kind="stable")[:top]
+        mejores_r, mejores_error = mejores_r[orden], mejores_error[orden]
+
+    mejores = [
+        (
+            [round(float(x), 6) for x in receta],
+            round(float(receta @ h), 3),
+            round(float(receta @ p), 3),
+            round(float(err), 6),
+        )
+        for receta, err in zip(mejores_r, mejores_error)
+    ]
+    return evaluadas, mejores
+
+
+# --- Caché por ciclo ---
+# _cache[ciclo][parametros] = resultado. Cualquier escritura en Materia Prima o
+# Tamo Húmedo del ciclo borra todas sus formulaciones. La generación evita guardar
+# un resultado calculado con datos que cambiaron mientras se resolvía. Cada ciclo
+# guarda como mucho MAX_CACHE_POR_CICLO resultados (se descarta el menos usado).
+_cache: Dict[str, Dict[str, dict]] = {}
+_generacion = 0
+_lock = threading.Lock()
+_TABLAS_FUENTE = {models.MateriaPrima.__tablename__, models.TamoHumedo.__tablename__}
+
+
+@eventos.registrar_oyente
+def _invalidar_cache(tabla: str, ciclo: str, origen=None, muestra=None) -> None:
+    global _generacion
+    if tabla == eventos.TODAS:
+        with _lock:
+            _cache.clear()
+            _generacion += 1
+    elif tabla in _TABLAS_FUENTE:
+        with _lock:
+            _cache.pop(ciclo, None)
+            _generacion += 1
+
+
+def optimizar_formulacion(
+    db: Session,
+    solicitud: schemas.FormulacionRequest,
+    avance: Optional[Callable[[float], None]] = None,
+) -> dict:
+    clean_ciclo = solicitud.ciclo.strip().upper()
+    parametros = solicitud.model_dump_json(exclude={"ciclo"})
+    # Los ingredientes se leen de la BD: primero se vuelcan los PUT diferidos
+    crud_escritura_diferida.vaciar()
+    with _lock:
+        por_parametros = _cache.get(clean_ciclo, {})
+        cacheado = por_parametros.pop(parametros, None)
+        if cacheado is not None:
+            por_parametros[parametros] = cacheado  # Al final: usado recientemente
+        generacion = _generacion
+    if cacheado is not None:
+        return {**cacheado, "desde_cache": True}
+
+    ingredientes = get_ingredientes_ciclo(db, clean_ciclo)
+    if solicitud.ingredientes:
+        pedidos = {nombre.strip().upper() for nombre in solicitud.ingredientes}
+        faltantes = pedidos - {i["nombre"] for i in ingredientes} - {AGUA["nombre"]}
+        if faltantes:
+            raise FormulacionError(
+                f"Ingredientes sin hprom/pH en el ciclo '{clean_ciclo}': {sorted(faltantes)}"
+            )
+        ingredientes = [i for i in ingredientes if i["nombre"] in pedidos]
+    if solicitud.incluir_agua:
+        ingredientes.append(dict(AGUA))
+    if len(ingredientes) < 2:
+        raise FormulacionError(
+            f"El ciclo '{clean_ciclo}' no tiene al menos dos ingredientes con hprom y pH."
+        )
+
+    candidatos = contar_candidatos(len(ingredientes), solicitud.paso)
+    if candidatos > MAX_CANDIDATOS:
+        raise FormulacionError(
+            f"{candidatos} recetas candidatas superan el máximo ({MAX_CANDIDATOS}); "
+            "usa un paso mayor o menos ingredientes."
+        )
+
+    nombres = [i["nombre"] for i in ingredientes]
+    minimos = {k.strip().upper(): v for k, v in solicitud.minimos.items()}
+    maximos = {k.strip().upper(): v for k, v in solicitud.maximos.items()}
+    # Un nombre mal escrito ignoraría la restricción y la receta no la respetaría
+    desconocidos = (set(minimos) | set(maximos)) - set(nombres)
+    if desconocidos:
+        raise FormulacionError(
+            f"minimos/maximos con ingredientes que no están en la formulación: "
+            f"{sorted(desconocidos)}; disponibles: {nombres}"
+        )
+    argumentos = (
+        [i["hprom"] for i in ingredientes],
+        [i["ph"] for i in ingredientes],
+        solicitud.humedad_objetivo,
+        solicitud.ph_objetivo,
+        solicitud.paso,
+        [minimos.get(n, 0.0) for n in nombres],
+        [maximos.get(n, 1.0) for n in nombres],
+        solicitud.tolerancia_humedad,
+        solicitud.tolerancia_ph,
+        solicitud.top,
+    )
+    if avance is not None:
+        # Dentro de un job ya estamos fuera de la petición: se resuelve aquí mismo
+        evaluadas, mejores = resolver_recetas(*argumentos, avance=avance)
+    elif candidatos > settings.FORMULACION_UMBRAL_POOL:
+        # Las rejillas grandes se calculan en otro proceso para no retener el GIL
+        # del worker de la API mientras dura el cálculo.
+        evaluadas, mejores = (
+            pool.get_process_pool().submit(resolver_recetas, *argumentos).result()
+        )
+    else:
+        evaluadas, mejores = resolver_recetas(*argumentos)
+
+    resultado = {
+        "ciclo": clean_ciclo,
+        "ingredientes": ingredientes,
+        "candidatos_evaluados": evaluadas,
+        "recetas": [
+            {
+                "proporciones": dict(zip(nombres, proporciones)),
+                "humedad": humedad,
+                "ph": ph,
+                "error": error,
+            }
+            for proporciones, humedad, ph, error in mejores
+        ],
+    }
+    with _lock:
+        if _generacion == generacion:
+            por_parametros = _cache.setdefault(clean_ciclo, {})
+            por_parametros[parametros] = resultado
+            while len(por_parametros) > MAX_CACHE_POR_CICLO:
+                del por_parametros[next(iter(por_parametros))]
+    print(
+        f"CRUD Formulacion: ciclo='{clean_ciclo}', {evaluadas} recetas evaluadas, {len(mejores)} devueltas"
+    )
+    return {**resultado, "desde_cache": False}
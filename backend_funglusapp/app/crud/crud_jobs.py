@@ -0,0 +1,134 @@
+# backend_funglusapp/app/crud/crud_jobs.py
+import json
+from datetime import datetime
+from typing import List, Optional
+
+from app.db import models
+from sqlalchemy.orm import Session
+
+# Estados de un job:
+#   pendiente -> en_curso -> completado | fallido | cancelado
+#   pendiente -> cancelado (si se cancela antes de empezar)
+ESTADOS_FINALES = ("completado", "fallido", "cancelado")
+
+
+def _ahora() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def create_job(db: Session, tipo: str, parametros: dict) -> models.Job:
+    job = models.Job(
+        tipo=tipo,
+        estado="pendiente",
+        parametros=json.dumps(parametros),
+        progreso=0.0,
+        cancelar=False,
+        creado_en=_ahora(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    print(f"CRUD Jobs: Job {job.id} ('{tipo}') creado")
+    return job
+
+
+def get_job(db: Session, job_id: int) -> Optional[models.Job]:
+    return db.get(models.Job, job_id)
+
+
+def get_jobs(
+    db: Session, estado: Optional[str] = None, skip: int = 0, limit: int = 100
+) -> List[models.Job]:
+    consulta = db.query(models.Job)
+    if estado:
+        consulta = consulta.filter(models.Job.estado == estado)
+    return consulta.order_by(models.Job.id.desc()).offset(skip).limit(limit).all()
+
+
+def get_jobs_por_estado(db: Session, estado: str) -> List[models.Job]:
+    return (
+        db.query(models.Job)
+        .filter(models.Job.estado == estado)
+        .order_by(models.Job.id)
+        .all()
+    )
+
+
+def reclamar_job(db: Session, job_id: int, worker_pid: int) -> bool:
+    """
+    Pasa el job de pendiente a en_curso de forma atómica. Devuelve False si otro
+    worker ya lo tomó o si se canceló antes de empezar.
+    """
+    filas = (
+        db.query(models.Job)
+        .filter(models.Job.id == job_id, models.Job.estado == "pendiente")
+        .update(
+            {
+                models.Job.estado: "en_curso",
+                models.Job.worker_pid: worker_pid,
+                models.Job.iniciado_en: _ahora(),
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return filas == 1
+
+
+def actualizar_progreso(
+    db: Session, job_id: int, progreso: float, mensaje: Optional[str] = None
+) -> bool:
+    """Guarda el avance y devuelve True si se pidió cancelar el job."""
+    valores = {models.Job.progreso: max(0.0, min(1.0, progreso))}
+    if mensaje is not None:
+        valores[models.Job.mensaje] = mensaje
+    db.query(models.Job).filter(models.Job.id == job_id).update(
+        valores, synchronize_session=False
+    )
+    db.commit()
+    return bool(db.query(models.Job.cancelar).filter(models.Job.id == job_id).scalar())
+
+
+def finalizar_job(
+    db: Session,
+    job_id: int,
+    estado: str,
+    resultado=None,
+    error: Optional[str] = None,
+) -> None:
+    valores = {
+        models.Job.estado: estado,
+        models.Job.finalizado_en: _ahora(),
+        models.Job.error: error,
+    }
+    if estado == "completado":
+        valores[models.Job.progreso] = 1.0
+        valores[models.Job.resultado] = json.dumps(resultado)
+    db.query(models.Job).filter(models.Job.id == job_id).update(
+        valores, synchronize_session=False
+    )
+    db.commit()
+    print(f"CRUD Jobs: Job {job_id} finalizado con estado '{estado}'")
+
+
+def solicitar_cancelacion(db: Session, job_id: int) -> Optional[models.Job]:
+    """
+    Un job pendiente se cancela de inmediato; uno en curso queda marcado y se
+    detiene en su siguiente reporte de progreso.
+    """
+    # Ambos UPDATE filtran por estado para no pisar a un worker que lo reclame a la vez
+    db.query(models.Job).filter(
+        models.Job.id == job_id, models.Job.estado == "pendiente"
+    ).update(
+        {
+            models.Job.estado: "cancelado",
+            models.Job.cancelar: True,
+            models.Job.finalizado_en: _ahora(),
+        },
+        synchronize_session=False,
+    )
+    db.query(models.Job).filter(
+        models.Job.id == job_id, models.Job.estado == "en_curso"
+    ).update({models.Job.cancelar: True}, synchronize_session=False)
+    db.commit()
+    return get_job(db, job_id)
@@ -1,7 +1,15 @@
 # backend_funglusapp/app/crud/crud_laboratorio.py
 from typing import List, Optional
 
-from app.db import models
+from app.core import eventos
+from app.core.config import settings
+from app.crud import (
+    crud_archivo,
+    crud_cache_eventos,
+    crud_calidad,
+    crud_escritura_diferida,
+)
+from app.db import dimensiones, models
 from app.schemas import (
     laboratorio_schemas as schemas,  # Asegúrate que esta importación sea correcta
 )
@@ -10,6 +18,48 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 
+def _ids_claves(
+    ciclo: str, origen: str, muestra: Optional[str] = None, crear: bool = False
+) -> Optional[dict]:
+    """
+    Traduce las claves de texto (ya limpias) a {ciclo_id, origen_id[, muestra_id]}
+    para filtrar con filter_by(). Devuelve None si alguna no existe todavía en su
+    tabla de dimensión: entonces tampoco puede existir la fila buscada.
+    """
+    claves = {
+        "ciclo_id": (models.DimCiclo, ciclo),
+        "origen_id": (models.DimOrigen, origen),
+    }
+    if muestra is not None:
+        claves["muestra_id"] = (models.DimMuestra, muestra)
+    ids = {}
+    for columna, (dimension, valor) in claves.items():
+        id_ = dimensiones.obtener_id(dimension, valor, crear=crear)
+        if id_ is None:
+            return None
+        ids[columna] = id_
+    return ids
+
+
+def _calcular_promedios(db_entry, update_data: dict) -> None:
+    """Recalcula hprom (y dprom en las tablas que lo tienen) tras aplicar un PUT."""
+    # Cálculo para Hprom
+    if db_entry.porc_h1 is not None and db_entry.porc_h2 is not None:
+        db_entry.hprom = round((db_entry.porc_h1 + db_entry.porc_h2) / 2, 3)
+    elif "porc_h1" in update_data or "porc_h2" in update_data:
+        if "hprom" not in update_data:
+            db_entry.hprom = None
+
+    if not hasattr(db_entry, "dprom"):
+        return
+    # Cálculo para Dprom
+    if db_entry.d1 is not None and db_entry.d2 is not None and db_entry.d3 is not None:
+        db_entry.dprom = round((db_entry.d1 + db_entry.d2 + db_entry.d3) / 3, 3)
+    elif "d1" in update_data or "d2" in update_data or "d3" in update_data:
+        if "dprom" not in update_data:
+            db_entry.dprom = None
+
+
 # --- MATERIA PRIMA CRUD ---
 def get_or_create_materia_prima_entry(
     db: Session, ciclo: str, origen: str, muestra: str
@@ -18,51 +68,57 @@ def get_or_create_materia_prima_entry(
     clean_origen = origen.strip().upper()
     clean_muestra = muestra.strip().upper()
 
+    if crud_archivo.get_ciclo_archivado(db, clean_ciclo):
+        # Ciclo cerrado: solo se pueden consultar las entradas que ya existían
+        archived_entry = crud_archivo.buscar_fila_archivada(
+            db, models.MateriaPrima, clean_ciclo, clean_origen, clean_muestra
+        )
+        if archived_entry is None:
+            raise crud_archivo.CicloArchivadoError(clean_ciclo)
+        return archived_entry
+
     print(
         f"CRUD MateriaPrima: Buscando con ciclo='{clean_ciclo}', origen='{clean_origen}', muestra='{clean_muestra}'"
     )
-    db_entry = (
-        db.query(models.MateriaPrima)
-        .filter(
-            models.MateriaPrima.ciclo == clean_ciclo,
-            models.MateriaPrima.origen == clean_origen,
-            models.MateriaPrima.muestra == clean_muestra,
-        )
-        .first()
-    )
+    ids = _ids_claves(clean_ciclo, clean_origen, clean_muestra, crear=True)
+    db_entry = db.query(models.MateriaPrima).filter_by(**ids).first()
 
     if db_entry:
         print(
             f"CRUD MateriaPrima: Placeholder YA EXISTE con key={db_entry.key} para ciclo='{clean_ciclo}', origen='{clean_origen}', muestra='{clean_muestra}'"
         )
-        return db_entry
+        return crud_escritura_diferida.superponer(db, db_entry)
     else:
         print(
             f"CRUD MateriaPrima: No se encontró. Intentando crear placeholder para ciclo='{clean_ciclo}', origen='{clean_origen}', muestra='{clean_muestra}'"
         )
-        new_entry = models.MateriaPrima(
-            ciclo=clean_ciclo, origen=clean_origen, muestra=clean_muestra
-        )
+        crud_archivo.bloquear_escritura(db, clean_ciclo)
+        new_entry = models.MateriaPrima(**ids)
         db.add(new_entry)
         try:
+            crud_cache_eventos.publicar(
+                db,
+                models.MateriaPrima.__tablename__,
+                clean_ciclo,
+                clean_origen,
+                clean_muestra,
+            )
             db.commit()
             db.refresh(new_entry)
             print(f"CRUD MateriaPrima: Placeholder CREADO con key={new_entry.key}")
+            eventos.notificar_escritura(
+                models.MateriaPrima.__tablename__,
+                clean_ciclo,
+                clean_origen,
+                clean_muestra,
+            )
             return new_entry
         except IntegrityError:
             db.rollback()
             print(
                 f"CRUD MateriaPrima: IntegrityError al crear (probablemente condición de carrera). Re-consultando..."
             )
-            existing_entry = (
-                db.query(models.MateriaPrima)
-                .filter(
-                    models.MateriaPrima.ciclo == clean_ciclo,
-                    models.MateriaPrima.origen == clean_origen,
-                    models.MateriaPrima.muestra == clean_muestra,
-                )
-                .first()
-            )
+            existing_entry = db.query(models.MateriaPrima).filter_by(**ids).first()
             if existing_entry:
                 print(
                     f"CRUD MateriaPrima: Placeholder encontrado después de IntegrityError, key={existing_entry.key}"
@@ -90,42 +146,57 @@ def update_materia_prima_entry(
     clean_origen = origen.strip().upper()
     clean_muestra = muestra.strip().upper()
 
-    db_entry = (
-        db.query(models.MateriaPrima)
-        .filter(
-            models.MateriaPrima.ciclo == clean_ciclo,
-            models.MateriaPrima.origen == clean_origen,
-            models.MateriaPrima.muestra == clean_muestra,
-        )
-        .first()
-    )
+    if crud_archivo.get_ciclo_archivado(db, clean_ciclo):
+        raise crud_archivo.CicloArchivadoError(clean_ciclo)
+
+    ids = _ids_claves(clean_ciclo, clean_origen, clean_muestra)
+    db_entry = db.query(models.MateriaPrima).filter_by(**ids).first() if ids else None
     if not db_entry:
         print(
             f"CRUD MateriaPrima: No se encontró entrada para actualizar con ciclo='{clean_ciclo}', origen='{clean_origen}', muestra='{clean_muestra}'"
         )
         return None
 
+    # Con escritura diferida el PUT se aplica sobre los cambios aún no volcados
+    db_entry = crud_escritura_diferida.superponer(db, db_entry)
     update_data = entry_data.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_entry, key, value)
 
-    # Cálculo para Hprom
-    if db_entry.porc_h1 is not None and db_entry.porc_h2 is not None:
-        db_entry.hprom = round((db_entry.porc_h1 + db_entry.porc_h2) / 2, 3)
-    elif "porc_h1" in update_data or "porc_h2" in update_data:
-        if "hprom" not in update_data:
-            db_entry.hprom = None
+    _calcular_promedios(db_entry, update_data)
 
-    # Cálculo para Dprom
-    if db_entry.d1 is not None and db_entry.d2 is not None and db_entry.d3 is not None:
-        db_entry.dprom = round((db_entry.d1 + db_entry.d2 + db_entry.d3) / 3, 3)
-    elif "d1" in update_data or "d2" in update_data or "d3" in update_data:
-        if "dprom" not in update_data:
-            db_entry.dprom = None
+    if settings.CALIDAD_VALIDAR_EN_PUT:
+        hallazgos = crud_calidad.validar_entrada(models.MateriaPrima, db_entry)
+        if hallazgos:
+            db.rollback()
+            raise crud_calidad.DatosFueraDeRangoError(hallazgos)
+
+    if settings.ESCRITURA_DIFERIDA:
+        crud_escritura_diferida.encolar(
+            db,
+            models.MateriaPrima,
+            db_entry,
+            update_data,
+            clean_ciclo,
+            clean_origen,
+            clean_muestra,
+        )
+        print(
+            f"CRUD MateriaPrima: Entrada encolada (escritura diferida) para ciclo='{clean_ciclo}', origen='{clean_origen}', muestra='{clean_muestra}'"
+        )
+        return db_entry
 
+    # El ciclo pudo archivarse mientras tanto: se comprueba ya con el lock tomado
+    crud_archivo.bloquear_escritura(db, clean_ciclo)
     db.add(db_entry)
+    crud_cache_eventos.publicar(
+        db, models.MateriaPrima.__tablename__, clean_ciclo, clean_origen, clean_muestra
+    )
     db.commit()
     db.refresh(db_entry)
+    eventos.notificar_escritura(
+        models.MateriaPrima.__tablename__, clean_ciclo, clean_origen, clean_muestra
+    )
     print(
         f"CRUD MateriaPrima: Entrada actualizada para ciclo='{clean_ciclo}', origen='{clean_origen}', muestra='{clean_muestra}'"
     )
@@ -135,13 +206,9 @@ def update_materia_prima_entry(
 def get_all_materia_prima_entries(
     db: Session, skip: int = 0, limit: int = 100
 ) -> List[models.MateriaPrima]:
-    return (
-        db.query(models.MateriaPrima)
-        .order_by(models.MateriaPrima.key.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    # Incluye las filas de ciclos archivados (lectura transparente)
+    entries = crud_archivo.combinar_con_archivo(db, models.MateriaPrima, skip, limit)
+    return [crud_escritura_diferida.superponer(db, entry) for entry in entries]
 
 
 # --- GUBYS CRUD --- (Clave: ciclo, origen)
@@ -149,39 +216,44 @@ def get_or_create_gubys_entry(db: Session, ciclo: str, origen: str) -> models.Gu
     clean_ciclo = ciclo.strip().upper()
     clean_origen = origen.strip().upper()
 
+    if crud_archivo.get_ciclo_archivado(db, clean_ciclo):
+        archived_entry = crud_archivo.buscar_fila_archivada(
+            db, models.Gubys, clean_ciclo, clean_origen
+        )
+        if archived_entry is None:
+            raise crud_archivo.CicloArchivadoError(clean_ciclo)
+        return archived_entry
+
     print(f"CRUD Gubys: Buscando con ciclo='{clean_ciclo}', origen='{clean_origen}'")
-    db_entry = (
-        db.query(models.Gubys)
-        .filter(models.Gubys.ciclo == clean_ciclo, models.Gubys.origen == clean_origen)
-        .first()
-    )
+    ids = _ids_claves(clean_ciclo, clean_origen, crear=True)
+    db_entry = db.query(models.Gubys).filter_by(**ids).first()
     if db_entry:
         print(
             f"CRUD Gubys: Placeholder YA EXISTE con key={db_entry.key} para ciclo='{clean_ciclo}', origen='{clean_origen}'"
         )
-        return db_entry
+        return crud_escritura_diferida.superponer(db, db_entry)
     else:
         print(
             f"CRUD Gubys: No se encontró. Creando placeholder para ciclo='{clean_ciclo}', origen='{clean_origen}'"
         )
-        new_entry = models.Gubys(ciclo=clean_ciclo, origen=clean_origen)
+        crud_archivo.bloquear_escritura(db, clean_ciclo)
+        new_entry = models.Gubys(**ids)
         db.add(new_entry)
         try:
+            crud_cache_eventos.publicar(
+                db, models.Gubys.__tablename__, clean_ciclo, clean_origen
+            )
             db.commit()
             db.refresh(new_entry)
             print(f"CRUD Gubys: Placeholder CREADO con key={new_entry.key}")
+            eventos.notificar_escritura(
+                models.Gubys.__tablename__, clean_ciclo, clean_origen
+            )
             return new_entry
         except IntegrityError:
             db.rollback()
             print(f"CRUD Gubys: IntegrityError al crear. Re-consultando...")
-            existing_entry = (
-                db.query(models.Gubys)
-                .filter(
-                    models.Gubys.ciclo == clean_ciclo,
-                    models.Gubys.origen == clean_origen,
-                )
-                .first()
-            )
+            existing_entry = db.query(models.Gubys).filter_by(**ids).first()
             if existing_entry:
                 print(
                     f"CRUD Gubys: Placeholder encontrado después de IntegrityError, key={existing_entry.key}"
@@ -204,30 +276,54 @@ def update_gubys_entry(
     clean_ciclo = ciclo.strip().upper()
     clean_origen = origen.strip().upper()
 
-    db_entry = (
-        db.query(models.Gubys)
-        .filter(models.Gubys.ciclo == clean_ciclo, models.Gubys.origen == clean_origen)
-        .first()
-    )
+    if crud_archivo.get_ciclo_archivado(db, clean_ciclo):
+        raise crud_archivo.CicloArchivadoError(clean_ciclo)
+
+    ids = _ids_claves(clean_ciclo, clean_origen)
+    db_entry = db.query(models.Gubys).filter_by(**ids).first() if ids else None
     if not db_entry:
         print(
             f"CRUD Gubys: No se encontró entrada para actualizar con ciclo='{clean_ciclo}', origen='{clean_origen}'"
         )
         return None
 
+    # Con escritura diferida el PUT se aplica sobre los cambios aún no volcados
+    db_entry = crud_escritura_diferida.superponer(db, db_entry)
     update_data = entry_data.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_entry, key, value)
 
-    if db_entry.porc_h1 is not None and db_entry.porc_h2 is not None:
-        db_entry.hprom = round((db_entry.porc_h1 + db_entry.porc_h2) / 2, 3)
-    elif "porc_h1" in update_data or "porc_h2" in update_data:
-        if "hprom" not in update_data:
-            db_entry.hprom = None
+    _calcular_promedios(db_entry, update_data)
+
+    if settings.CALIDAD_VALIDAR_EN_PUT:
+        hallazgos = crud_calidad.validar_entrada(models.Gubys, db_entry)
+        if hallazgos:
+            db.rollback()
+            raise crud_calidad.DatosFueraDeRangoError(hallazgos)
+
+    if settings.ESCRITURA_DIFERIDA:
+        crud_escritura_diferida.encolar(
+            db,
+            models.Gubys,
+            db_entry,
+            update_data,
+            clean_ciclo,
+            clean_origen,
+        )
+        print(
+            f"CRUD Gubys: Entrada encolada (escritura diferida) para ciclo='{clean_ciclo}', origen='{clean_origen}'"
+        )
+        return db_entry
 
+    # El ciclo pudo archivarse mientras tanto: se comprueba ya con el lock tomado
+    crud_archivo.bloquear_escritura(db, clean_ciclo)
     db.add(db_entry)
+    crud_cache_eventos.publicar(
+        db, models.Gubys.__tablename__, clean_ciclo, clean_origen
+    )
     db.commit()
     db.refresh(db_entry)
+    eventos.notificar_escritura(models.Gubys.__tablename__, clean_ciclo, clean_origen)
     print(
         f"CRUD Gubys: Entrada actualizada para ciclo='{clean_ciclo}', origen='{clean_origen}'"
     )
@@ -237,13 +333,9 @@ def update_gubys_entry(
 def get_all_gubys_entries(
     db: Session, skip: int = 0, limit: int = 100
 ) -> List[models.Gubys]:
-    return (
-        db.query(models.Gubys)
-        .order_by(models.Gubys.key.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    # Incluye las filas de ciclos archivados (lectura transparente)
+    entries = crud_archivo.combinar_con_archivo(db, models.Gubys, skip, limit)
+    return [crud_escritura_diferida.superponer(db, entry) for entry in entries]
 
 
 # --- TAMO HUMEDO CRUD --- (Clave: ciclo, origen)
@@ -253,44 +345,46 @@ def get_or_create_tamo_humedo_entry(
     clean_ciclo = ciclo.strip().upper()
     clean_origen = origen.strip().upper()
 
+    if crud_archivo.get_ciclo_archivado(db, clean_ciclo):
+        archived_entry = crud_archivo.buscar_fila_archivada(
+            db, models.TamoHumedo, clean_ciclo, clean_origen
+        )
+        if archived_entry is None:
+            raise crud_archivo.CicloArchivadoError(clean_ciclo)
+        return archived_entry
+
     print(
         f"CRUD TamoHumedo: Buscando con ciclo='{clean_ciclo}', origen='{clean_origen}'"
     )
-    db_entry = (
-        db.query(models.TamoHumedo)
-        .filter(
-            models.TamoHumedo.ciclo == clean_ciclo,
-            models.TamoHumedo.origen == clean_origen,
-        )
-        .first()
-    )
+    ids = _ids_claves(clean_ciclo, clean_origen, crear=True)
+    db_entry = db.query(models.TamoHumedo).filter_by(**ids).first()
     if db_entry:
         print(
             f"CRUD TamoHumedo: Placeholder YA EXISTE con key={db_entry.key} para ciclo='{clean_ciclo}', origen='{clean_origen}'"
         )
-        return db_entry
+        return crud_escritura_diferida.superponer(db, db_entry)
     else:
         print(
             f"CRUD TamoHumedo: No se encontró. Creando placeholder para ciclo='{clean_ciclo}', origen='{clean_origen}'"
         )
-        new_entry = models.TamoHumedo(ciclo=clean_ciclo, origen=clean_origen)
+        crud_archivo.bloquear_escritura(db, clean_ciclo)
+        new_entry = models.TamoHumedo(**ids)
         db.add(new_entry)
         try:
+            crud_cache_eventos.publicar(
+                db, models.TamoHumedo.__tablename__, clean_ciclo, clean_origen
+            )
             db.commit()
             db.refresh(new_entry)
             print(f"CRUD TamoHumedo: Placeholder CREADO con key={new_entry.key}")
+            eventos.notificar_escritura(
+                models.TamoHumedo.__tablename__, clean_ciclo, clean_origen
+            )
             return new_entry
         except IntegrityError:
             db.rollback()
             print(f"CRUD TamoHumedo: IntegrityError al crear. Re-consultando...")
-            existing_entry = (
-                db.query(models.TamoHumedo)
-                .filter(
-                    models.TamoHumedo.ciclo == clean_ciclo,
-                    models.TamoHumedo.origen == clean_origen,
-                )
-                .first()
-            )
+            existing_entry = db.query(models.TamoHumedo).filter_by(**ids).first()
             if existing_entry:
                 print(
                     f"CRUD TamoHumedo: Placeholder encontrado después de IntegrityError, key={existing_entry.key}"
@@ -313,41 +407,56 @@ def update_tamo_humedo_entry(
     clean_ciclo = ciclo.strip().upper()
     clean_origen = origen.strip().upper()
 
-    db_entry = (
-        db.query(models.TamoHumedo)
-        .filter(
-            models.TamoHumedo.ciclo == clean_ciclo,
-            models.TamoHumedo.origen == clean_origen,
-        )
-        .first()
-    )
+    if crud_archivo.get_ciclo_archivado(db, clean_ciclo):
+        raise crud_archivo.CicloArchivadoError(clean_ciclo)
+
+    ids = _ids_claves(clean_ciclo, clean_origen)
+    db_entry = db.query(models.TamoHumedo).filter_by(**ids).first() if ids else None
     if not db_entry:
         print(
             f"CRUD TamoHumedo: No se encontró entrada para actualizar con ciclo='{clean_ciclo}', origen='{clean_origen}'"
         )
         return None
 
+    # Con escritura diferida el PUT se aplica sobre los cambios aún no volcados
+    db_entry = crud_escritura_diferida.superponer(db, db_entry)
     update_data = entry_data.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_entry, key, value)
 
-    # Cálculo para Hprom
-    if db_entry.porc_h1 is not None and db_entry.porc_h2 is not None:
-        db_entry.hprom = round((db_entry.porc_h1 + db_entry.porc_h2) / 2, 3)
-    elif "porc_h1" in update_data or "porc_h2" in update_data:
-        if "hprom" not in update_data:
-            db_entry.hprom = None
+    _calcular_promedios(db_entry, update_data)
 
-    # Cálculo para Dprom
-    if db_entry.d1 is not None and db_entry.d2 is not None and db_entry.d3 is not None:
-        db_entry.dprom = round((db_entry.d1 + db_entry.d2 + db_entry.d3) / 3, 3)
-    elif "d1" in update_data or "d2" in update_data or "d3" in update_data:
-        if "dprom" not in update_data:
-            db_entry.dprom = None
+    if settings.CALIDAD_VALIDAR_EN_PUT:
+        hallazgos = crud_calidad.validar_entrada(models.TamoHumedo, db_entry)
+        if hallazgos:
+            db.rollback()
+            raise crud_calidad.DatosFueraDeRangoError(hallazgos)
+
+    if settings.ESCRITURA_DIFERIDA:
+        crud_escritura_diferida.encolar(
+            db,
+            models.TamoHumedo,
+            db_entry,
+            update_data,
+            clean_ciclo,
+            clean_origen,
+        )
+        print(
+            f"CRUD TamoHumedo: Entrada encolada (escritura diferida) para ciclo='{clean_ciclo}', origen='{clean_origen}'"
+        )
+        return db_entry
 
+    # El ciclo pudo archivarse mientras tanto: se comprueba ya con el lock tomado
+    crud_archivo.bloquear_escritura(db, clean_ciclo)
     db.add(db_entry)
+    crud_cache_eventos.publicar(
+        db, models.TamoHumedo.__tablename__, clean_ciclo, clean_origen
+    )
     db.commit()
     db.refresh(db_entry)
+    eventos.notificar_escritura(
+        models.TamoHumedo.__tablename__, clean_ciclo, clean_origen
+    )
     print(
         f"CRUD TamoHumedo: Entrada actualizada para ciclo='{clean_ciclo}', origen='{clean_origen}'"
     )
@@ -357,10 +466,6 @@ def update_tamo_humedo_entry(
 def get_all_tamo_humedo_entries(
     db: Session, skip: int = 0, limit: int = 100
 ) -> List[models.TamoHumedo]:
-    return (
-        db.query(models.TamoHumedo)
-        .order_by(models.TamoHumedo.key.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    # Incluye las filas de ciclos archivados (lectura transparente)
+    entries = crud_archivo.combinar_con_archivo(db, models.TamoHumedo, skip, limit)
+    return [crud_escritura_diferida.superponer(db, entry) for entry in entries]
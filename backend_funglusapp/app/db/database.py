@@ -1,14 +1,30 @@
 # backend_funglusapp/app/db/database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from app.core.config import settings # Importa tu configuración
 
 engine = create_engine(
     settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} # Necesario para SQLite con FastAPI
+    connect_args={
+        "check_same_thread": False, # Necesario para SQLite con FastAPI
+        "timeout": settings.DB_BUSY_TIMEOUT, # Espera si otro proceso está escribiendo
+    },
+    # Pool propio de cada proceso (worker)
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
 )
 
+
+@event.listens_for(engine, "connect")
+def _configurar_sqlite(dbapi_connection, connection_record):
+    if settings.WORKERS > 1:
+        # WAL: las lecturas de un worker no esperan a la escritura de otro
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
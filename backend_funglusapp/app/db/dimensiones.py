@@ -0,0 +1,98 @@
+# backend_funglusapp/app/db/dimensiones.py
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .database import engine
+
+# Caché en proceso de las tablas de dimensión (dim_ciclo, dim_origen, dim_muestra).
+# Las tablas de laboratorio guardan solo los IDs enteros; la API sigue recibiendo y
+# devolviendo texto. Son tablas pequeñas que solo crecen (un valor nunca cambia de
+# ID), así que una vez cacheado un par valor<->ID no hace falta invalidarlo.
+# Los fallos de caché se resuelven con su propia conexión: un ID nuevo se confirma
+# aunque la transacción de quien lo pidió termine en rollback.
+
+
+class _Cache:
+    def __init__(self):
+        self.por_valor: Dict[str, int] = {}
+        self.por_id: Dict[int, str] = {}
+
+    def guardar(self, valor: str, id_: int) -> None:
+        self.por_valor[valor] = id_
+        self.por_id[id_] = valor
+
+
+_caches: Dict[str, _Cache] = {}
+_lock = threading.Lock()
+
+
+def _cache(dimension) -> _Cache:
+    cache = _caches.get(dimension.__tablename__)
+    if cache is None:
+        with _lock:
+            cache = _caches.setdefault(dimension.__tablename__, _Cache())
+    return cache
+
+
+def obtener_id(dimension, valor: str, crear: bool = False) -> Optional[int]:
+    """
+    ID del valor (ya limpio con strip().upper()) en la tabla de dimensión. Con
+    crear=True lo inserta si no existe; si no, devuelve None.
+    """
+    cache = _cache(dimension)
+    id_ = cache.por_valor.get(valor)
+    if id_ is not None:
+        return id_
+    consulta = select(dimension.id).where(dimension.valor == valor)
+    if crear:
+        with engine.begin() as conexion:
+            # OR IGNORE: otro worker pudo crearlo a la vez
+            conexion.execute(
+                sqlite_insert(dimension)
+                .values(valor=valor)
+                .on_conflict_do_nothing(index_elements=["valor"])
+            )
+            id_ = conexion.execute(consulta).scalar()
+    else:
+        with engine.connect() as conexion:
+            id_ = conexion.execute(consulta).scalar()
+    if id_ is not None:
+        with _lock:
+            cache.guardar(valor, id_)
+    return id_
+
+
+def obtener_valor(dimension, id_: Optional[int]) -> Optional[str]:
+    if id_ is None:
+        return None
+    cache = _cache(dimension)
+    valor = cache.por_id.get(id_)
+    if valor is None:
+        with engine.connect() as conexion:
+            valor = conexion.execute(
+                select(dimension.valor).where(dimension.id == id_)
+            ).scalar()
+        if valor is not None:
+            with _lock:
+                cache.guardar(valor, id_)
+    return valor
+
+
+def obtener_valores(dimension, ids: Iterable[Optional[int]]) -> List[Optional[str]]:
+    """Traduce muchos IDs de una vez (lecturas masivas con Core)."""
+    cache = _cache(dimension)
+    return [cache.por_id.get(id_) or obtener_valor(dimension, id_) for id_ in ids]
+
+
+def precargar(dimensiones) -> None:
+    """Carga completa al arrancar: las dimensiones caben de sobra en memoria."""
+    with engine.connect() as conexion:
+        for dimension in dimensiones:
+            filas = conexion.execute(select(dimension.id, dimension.valor)).fetchall()
+            cache = _cache(dimension)
+            with _lock:
+                for id_, valor in filas:
+                    cache.guardar(valor, id_)
@@ -0,0 +1,98 @@
+# backend_funglusapp/app/db/migraciones.py
+from sqlalchemy import inspect, text
+
+from . import models
+
+# create_all() solo crea tablas que faltan, no cambia las existentes. Aquí se
+# actualizan las BD creadas con un esquema anterior. Se ejecuta al arrancar, antes
+# de create_all(), y cada migración comprueba ella misma si hace falta.
+
+_TABLAS_LABORATORIO = (models.MateriaPrima, models.Gubys, models.TamoHumedo)
+
+
+def _tablas_con_claves_texto(engine) -> list:
+    inspector = inspect(engine)
+    existentes = set(inspector.get_table_names())
+    return [
+        modelo
+        for modelo in _TABLAS_LABORATORIO
+        if modelo.__tablename__ in existentes
+        and "ciclo" in {c["name"] for c in inspector.get_columns(modelo.__tablename__)}
+    ]
+
+
+def migrar_claves_a_dimensiones(engine) -> bool:
+    """
+    Pasa las tablas de laboratorio de claves en texto (ciclo/origen/muestra con un
+    índice cada una) a IDs de las tablas de dimensión con un único índice compuesto.
+    Las keys se conservan, así que los archivos de ciclos archivados siguen
+    cuadrando, y la secuencia AUTOINCREMENT arranca por encima de la mayor key
+    activa o archivada. Devuelve True si migró algo.
+    """
+    pendientes = _tablas_con_claves_texto(engine)
+    if not pendientes:
+        return False
+
+    with engine.begin() as conexion:
+        for dimension in models.DIMENSIONES.values():
+            dimension.__table__.create(conexion, checkfirst=True)
+
+        for modelo in pendientes:
+            tabla = modelo.__tablename__
+            antigua = f"{tabla}_anterior"
+            conexion.execute(text(f'ALTER TABLE "{tabla}" RENAME TO "{antigua}"'))
+            # Los índices de una columna viajan con la tabla renombrada y se borran con ella
+            modelo.__table__.create(conexion)
+
+            columnas_antiguas = [
+                c["name"] for c in inspect(conexion).get_columns(antigua)
+            ]
+            destino, origen, joins = [], [], []
+            for columna in columnas_antiguas:
+                if columna in models.DIMENSIONES:
+                    nueva, dimension = f"{columna}_id", models.DIMENSIONES[columna]
+                    alias = f"d_{columna}"
+                    # Los valores ya se guardaban limpios (strip().upper()) por los CRUD
+                    conexion.execute(
+                        text(
+                            f'INSERT OR IGNORE INTO "{dimension.__tablename__}" (valor) '
+                            f'SELECT DISTINCT "{columna}" FROM "{antigua}"'
+                        )
+                    )
+                    destino.append(f'"{nueva}"')
+                    origen.append(f"{alias}.id")
+                    joins.append(
+                        f'JOIN "{dimension.__tablename__}" {alias} '
+                        f'ON {alias}.valor = a."{columna}"'
+                    )
+                else:
+                    destino.append(f'"{columna}"')
+                    origen.append(f'a."{columna}"')
+            copiadas = conexion.execute(
+                text(
+                    f'INSERT INTO "{tabla}" ({", ".join(destino)}) '
+                    f'SELECT {", ".join(origen)} FROM "{antigua}" a {" ".join(joins)}'
+                )
+            ).rowcount
+            conexion.execute(text(f'DROP TABLE "{antigua}"'))
+            print(
+                f"INFO:     Migración: '{tabla}' pasó a claves por ID ({copiadas} filas)."
+            )
+
+        # El INSERT deja sqlite_sequence en la mayor key activa; las de los ciclos
+        # archivados antes de migrar (ya fuera de la tabla) tampoco se deben reutilizar
+        if models.CicloArchivado.__tablename__ in inspect(conexion).get_table_names():
+            from app.crud import crud_archivo
+
+            crud_archivo.reservar_keys(
+                conexion, crud_archivo.keys_maximas_archivadas(conexion)
+            )
+
+    # Devuelve al sistema las páginas de los índices de texto eliminados
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        conexion.execute(text("VACUUM"))
+    return True
+
+
+def aplicar_migraciones(engine) -> None:
+    migrar_claves_a_dimensiones(engine)
@@ -1,15 +1,62 @@
 # backend_funglusapp/app/db/models.py
-from sqlalchemy import Column, Float, Integer, String, UniqueConstraint
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Float,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+)
 
+from . import dimensiones
 from .database import Base
 
 
-class MateriaPrima(Base):
+# --- Tablas de dimensión ---
+# Cada ciclo/origen/muestra distinto se guarda una sola vez; las tablas de
+# laboratorio lo referencian con un entero (ver app/db/dimensiones.py).
+class DimCiclo(Base):
+    __tablename__ = "dim_ciclo"
+    id = Column(Integer, primary_key=True)
+    valor = Column(String, unique=True, nullable=False)
+
+
+class DimOrigen(Base):
+    __tablename__ = "dim_origen"
+    id = Column(Integer, primary_key=True)
+    valor = Column(String, unique=True, nullable=False)
+
+
+class DimMuestra(Base):
+    __tablename__ = "dim_muestra"
+    id = Column(Integer, primary_key=True)
+    valor = Column(String, unique=True, nullable=False)
+
+
+# Nombre de la clave en texto -> tabla de dimensión (la columna es f"{nombre}_id")
+DIMENSIONES = {"ciclo": DimCiclo, "origen": DimOrigen, "muestra": DimMuestra}
+
+
+class _ClavesTexto:
+    # Las claves en texto siguen disponibles como atributos de solo lectura (los
+    # schemas *InDB y el resto del código las leen igual que antes).
+    @property
+    def ciclo(self) -> str:
+        return dimensiones.obtener_valor(DimCiclo, self.ciclo_id)
+
+    @property
+    def origen(self) -> str:
+        return dimensiones.obtener_valor(DimOrigen, self.origen_id)
+
+
+class MateriaPrima(_ClavesTexto, Base):
     __tablename__ = "lab_materia_prima"
-    key = Column(Integer, primary_key=True, index=True)
-    ciclo = Column(String, index=True, nullable=False)
-    origen = Column(String, index=True, nullable=False)  # Clave
-    muestra = Column(String, index=True, nullable=False)  # Clave
+    key = Column(Integer, primary_key=True)
+    ciclo_id = Column(Integer, ForeignKey("dim_ciclo.id"), nullable=False)
+    origen_id = Column(Integer, ForeignKey("dim_origen.id"), nullable=False)  # Clave
+    muestra_id = Column(Integer, ForeignKey("dim_muestra.id"), nullable=False)  # Clave
 
     fecha_i = Column(String, nullable=True)
     fecha_p = Column(String, nullable=True)
@@ -26,17 +73,24 @@ class MateriaPrima(Base):
     dprom = Column(Float, nullable=True)
 
     __table_args__ = (
+        # Único índice de la tabla además de la PK (sirve para todas las búsquedas)
         UniqueConstraint(
-            "ciclo", "origen", "muestra", name="_mp_ciclo_origen_muestra_uc"
+            "ciclo_id", "origen_id", "muestra_id", name="_mp_ciclo_origen_muestra_uc"
         ),
+        # AUTOINCREMENT: una key borrada al archivar un ciclo no se reutiliza
+        {"sqlite_autoincrement": True},
     )
 
+    @property
+    def muestra(self) -> str:
+        return dimensiones.obtener_valor(DimMuestra, self.muestra_id)
+
 
-class Gubys(Base):
+class Gubys(_ClavesTexto, Base):
     __tablename__ = "lab_gubys"
-    key = Column(Integer, primary_key=True, index=True)
-    ciclo = Column(String, index=True, nullable=False)  # Clave
-    origen = Column(String, index=True, nullable=False)  # Clave
+    key = Column(Integer, primary_key=True)
+    ciclo_id = Column(Integer, ForeignKey("dim_ciclo.id"), nullable=False)  # Clave
+    origen_id = Column(Integer, ForeignKey("dim_origen.id"), nullable=False)  # Clave
     # Muestra ya no es clave para Gubys, si lo necesitas como campo de datos, añádelo:
     # muestra = Column(String, nullable=True)
 
@@ -51,15 +105,16 @@ class Gubys(Base):
     hprom = Column(Float, nullable=True)  # Calculado
 
     __table_args__ = (
-        UniqueConstraint("ciclo", "origen", name="_gubys_ciclo_origen_uc"),
+        UniqueConstraint("ciclo_id", "origen_id", name="_gubys_ciclo_origen_uc"),
+        {"sqlite_autoincrement": True},
     )  # CAMBIO AQUÍ
 
 
-class TamoHumedo(Base):
+class TamoHumedo(_ClavesTexto, Base):
     __tablename__ = "lab_tamo_humedo"
-    key = Column(Integer, primary_key=True, index=True)
-    ciclo = Column(String, index=True, nullable=False)  # Clave
-    origen = Column(String, index=True, nullable=False)  # Clave
+    key = Column(Integer, primary_key=True)
+    ciclo_id = Column(Integer, ForeignKey("dim_ciclo.id"), nullable=False)  # Clave
+    origen_id = Column(Integer, ForeignKey("dim_origen.id"), nullable=False)  # Clave
     # Muestra ya no es clave para TamoHumedo, si lo necesitas como campo de datos, añádelo:
     # muestra = Column(String, nullable=True)
 
@@ -78,8 +133,53 @@ class TamoHumedo(Base):
     dprom = Column(Float, nullable=True)
 
     __table_args__ = (
-        UniqueConstraint("ciclo", "origen", name="_tamo_humedo_ciclo_origen_uc"),
+        UniqueConstraint("ciclo_id", "origen_id", name="_tamo_humedo_ciclo_origen_uc"),
+        {"sqlite_autoincrement": True},
     )  # CAMBIO AQUÍ
 
 
+class CicloArchivado(Base):
+    # Índice de ciclos cerrados: indica en qué archivo vive cada ciclo movido
+    # fuera de las tablas de laboratorio (ver crud_archivo).
+    __tablename__ = "ciclos_archivados"
+    ciclo = Column(String, primary_key=True)
+    ruta = Column(String, nullable=False)
+    filas = Column(Integer, nullable=False, default=0)
+    archivado_en = Column(String, nullable=False)
+
+
+class Job(Base):
+    # Trabajos pesados que se ejecutan fuera de la petición (ver app/jobs)
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String, nullable=False)
+    estado = Column(String, index=True, nullable=False, default="pendiente")
+    parametros = Column(Text, nullable=True)  # JSON
+    resultado = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    progreso = Column(Float, nullable=False, default=0.0)  # 0 a 1
+    mensaje = Column(String, nullable=True)
+    cancelar = Column(Boolean, nullable=False, default=False)
+    worker_pid = Column(Integer, nullable=True)
+    creado_en = Column(String, nullable=False)
+    iniciado_en = Column(String, nullable=True)
+    finalizado_en = Column(String, nullable=True)
+
+
+class CacheEvento(Base):
+    # Avisos de escritura entre workers (ver crud_cache_eventos): cada proceso lee
+    # los que publicaron los demás e invalida sus cachés en memoria.
+    __tablename__ = "cache_eventos"
+    id = Column(Integer, primary_key=True)
+    tabla = Column(String, nullable=False)
+    ciclo = Column(String, nullable=True)
+    origen = Column(String, nullable=True)
+    muestra = Column(String, nullable=True)
+    pid = Column(Integer, nullable=False)
+    creado_en = Column(Float, nullable=False)  # time.time()
+
+    # AUTOINCREMENT: los ids nunca se reutilizan tras podar, cada worker guarda el último leído
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
+
 # La clase Formulacion ha sido eliminada.
@@ -0,0 +1,169 @@
+# backend_funglusapp/app/jobs/planificador.py
+import json
+import os
+import traceback
+from concurrent.futures import Executor
+from typing import Optional
+
+from app.core import eventos, pool
+from app.core.config import settings
+from app.crud import crud_escritura_diferida, crud_jobs
+from app.db import database, models
+from app.jobs.tareas import TAREAS, ContextoJob, JobCancelado
+from sqlalchemy.orm import Session
+
+# Planificador de jobs: cada job se guarda en la tabla "jobs" y su id se envía a un
+# pool de hilos o de procesos (settings.JOBS_EJECUTOR). El worker lo reclama de
+# forma atómica, así que enviar dos veces el mismo id no lo ejecuta dos veces.
+
+_ejecutor: Optional[Executor] = None
+_en_subproceso = False
+
+
+class TipoJobDesconocido(ValueError):
+    pass
+
+
+def _inicializar_subproceso() -> None:
+    global _en_subproceso
+    _en_subproceso = True
+    # Las conexiones heredadas del proceso padre no se deben reutilizar
+    database.engine.dispose(close=False)
+
+
+def _get_ejecutor() -> Executor:
+    global _ejecutor
+    if _ejecutor is None:
+        inicializador = (
+            _inicializar_subproceso if settings.JOBS_EJECUTOR == "process" else None
+        )
+        _ejecutor = pool.crear_ejecutor(
+            settings.JOBS_EJECUTOR, settings.JOBS_MAX_WORKERS, inicializador
+        )
+    return _ejecutor
+
+
+def _proceso_vivo(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _ejecutar_job(job_id: int) -> None:
+    db = database.SessionLocal()
+    try:
+        if not crud_jobs.reclamar_job(db, job_id, os.getpid()):
+            return
+        # Todo lo que sigue al reclamo puede fallar: el job no debe quedar "en_curso"
+        try:
+            job = crud_jobs.get_job(db, job_id)
+            tarea = TAREAS[job.tipo]
+            parametros = json.loads(job.parametros or "{}")
+            if _en_subproceso:
+                # Las cachés de este proceso no reciben los avisos de escritura del API
+                eventos.invalidar_todo()
+            resultado = tarea.funcion(db, parametros, ContextoJob(job_id))
+            crud_jobs.finalizar_job(db, job_id, "completado", resultado=resultado)
+        except JobCancelado:
+            db.rollback()
+            crud_jobs.finalizar_job(db, job_id, "cancelado")
+        except Exception as e:
+            db.rollback()
+            traceback.print_exc()
+            crud_jobs.finalizar_job(db, job_id, "fallido", error=str(e))
+    finally:
+        db.close()
+
+
+def _ciclo_a_archivar(tipo: str, parametros: dict) -> Optional[str]:
+    if tipo != "archivar_ciclo" or not parametros.get("ciclo"):
+        return None
+    return parametros["ciclo"].strip().upper()
+
+
+def _avisar_escrituras(tipo: str, parametros: dict) -> None:
+    # Las escrituras hechas en un subproceso no avisan a las cachés de este proceso:
+    # se emiten aquí los avisos de las tablas que la tarea declara modificar
+    tarea = TAREAS.get(tipo)
+    if tarea is None or not tarea.escribe:
+        return
+    ciclo = (parametros.get("ciclo") or "").strip().upper()
+    if not ciclo:
+        eventos.invalidar_todo()
+        return
+    for tabla in tarea.escribe:
+        eventos.notificar_escritura(tabla, ciclo)
+
+
+def _enviar(job_id: int, tipo: str, parametros: dict) -> None:
+    ciclo_a_archivar = _ciclo_a_archivar(tipo, parametros)
+    if ciclo_a_archivar:
+        # El job puede correr en otro proceso, que no ve los PUT diferidos de este:
+        # aquí se bloquean los del ciclo hasta que termine
+        crud_escritura_diferida.bloquear_ciclo(ciclo_a_archivar)
+    # Un subproceso no ve el buffer de escritura diferida de este proceso
+    crud_escritura_diferida.vaciar()
+    try:
+        futuro = _get_ejecutor().submit(_ejecutar_job, job_id)
+    except Exception:
+        if ciclo_a_archivar:
+            crud_escritura_diferida.desbloquear_ciclo(ciclo_a_archivar)
+        raise
+    if ciclo_a_archivar:
+        futuro.add_done_callback(
+            lambda _: crud_escritura_diferida.desbloquear_ciclo(ciclo_a_archivar)
+        )
+    if settings.JOBS_EJECUTOR == "process":
+        futuro.add_done_callback(lambda _: _avisar_escrituras(tipo, parametros))
+
+
+def enviar_job(db: Session, tipo: str, parametros: dict) -> models.Job:
+    """Valida los parámetros, persiste el job y lo pone en cola."""
+    tarea = TAREAS.get(tipo)
+    if tarea is None:
+        raise TipoJobDesconocido(
+            f"Tipo de job desconocido: '{tipo}'. Disponibles: {sorted(TAREAS)}"
+        )
+    validados = tarea.esquema(**parametros).model_dump(mode="json")
+    job = crud_jobs.create_job(db, tipo, validados)
+    _enviar(job.id, tipo, validados)
+    return job
+
+
+def iniciar() -> None:
+    """
+    Arranca el pool y retoma la cola persistente: los jobs pendientes se vuelven a
+    enviar y los que estaban en curso en un proceso que ya no existe se marcan fallidos.
+    """
+    db = database.SessionLocal()
+    try:
+        for job in crud_jobs.get_jobs_por_estado(db, "en_curso"):
+            if job.worker_pid == os.getpid() or not _proceso_vivo(job.worker_pid):
+                crud_jobs.finalizar_job(
+                    db,
+                    job.id,
+                    "fallido",
+                    error="Interrumpido por reinicio del servidor",
+                )
+        pendientes = crud_jobs.get_jobs_por_estado(db, "pendiente")
+        for job in pendientes:
+            _enviar(job.id, job.tipo, json.loads(job.parametros or "{}"))
+    finally:
+        db.close()
+    print(
+        f"INFO:     Planificador de jobs iniciado ({settings.JOBS_EJECUTOR}, "
+        f"{settings.JOBS_MAX_WORKERS} workers, {len(pendientes)} pendientes)."
+    )
+
+
+def detener() -> None:
+    global _ejecutor
+    if _ejecutor is not None:
+        _ejecutor.shutdown(wait=False, cancel_futures=True)
+        _ejecutor = None
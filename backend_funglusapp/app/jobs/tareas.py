@@ -0,0 +1,106 @@
+# backend_funglusapp/app/jobs/tareas.py
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple, Type
+
+from app.crud import crud_archivo, crud_calidad, crud_formulacion, crud_jobs
+from app.db import database
+from app.schemas import formulacion_schemas
+from app.schemas import jobs_schemas as schemas
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+# Tipos de job disponibles. Cada tarea recibe (db, parametros, ctx) y devuelve un
+# resultado serializable a JSON; ctx.progreso() reporta el avance y lanza
+# JobCancelado si alguien pidió cancelar el job.
+
+INTERVALO_PROGRESO = 0.5  # Segundos mínimos entre escrituras de progreso en la BD
+
+
+class JobCancelado(Exception):
+    pass
+
+
+class ContextoJob:
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self._ultimo_reporte = 0.0
+        self._ultimo_mensaje: Optional[str] = None
+
+    def progreso(self, fraccion: float, mensaje: Optional[str] = None) -> None:
+        ahora = time.monotonic()
+        nuevo_mensaje = mensaje is not None and mensaje != self._ultimo_mensaje
+        if not nuevo_mensaje and ahora - self._ultimo_reporte < INTERVALO_PROGRESO:
+            return
+        self._ultimo_reporte = ahora
+        self._ultimo_mensaje = mensaje if mensaje is not None else self._ultimo_mensaje
+        # Sesión propia: el progreso no debe confirmar el trabajo a medias de la tarea
+        db = database.SessionLocal()
+        try:
+            cancelar = crud_jobs.actualizar_progreso(db, self.job_id, fraccion, mensaje)
+        finally:
+            db.close()
+        if cancelar:
+            raise JobCancelado()
+
+
+class Tarea(NamedTuple):
+    funcion: Callable[[Session, dict, ContextoJob], object]
+    esquema: Type[BaseModel]
+    # Tablas de laboratorio que modifica (en el ciclo de sus parámetros): si corre en
+    # un subproceso, el API avisa a sus cachés solo de estas. Vacío = solo lectura.
+    escribe: Tuple[str, ...] = ()
+
+
+TAREAS: Dict[str, Tarea] = {}
+
+
+def registrar_tarea(
+    nombre: str, esquema: Type[BaseModel], escribe: Tuple[str, ...] = ()
+):
+    def decorador(funcion):
+        TAREAS[nombre] = Tarea(funcion, esquema, escribe)
+        return funcion
+
+    return decorador
+
+
+@registrar_tarea(
+    "archivar_ciclo",
+    schemas.JobArchivarCicloParams,
+    escribe=tuple(crud_archivo.TABLAS_ARCHIVABLES),
+)
+def archivar_ciclo(db: Session, parametros: dict, ctx: ContextoJob):
+    ctx.progreso(0.0, f"Archivando ciclo '{parametros['ciclo']}'")
+    registro = crud_archivo.archivar_ciclo(db, parametros["ciclo"])
+    if registro is None:
+        raise ValueError(f"El ciclo '{parametros['ciclo']}' no tiene entradas.")
+    return {
+        "ciclo": registro.ciclo,
+        "ruta": registro.ruta,
+        "filas": registro.filas,
+        "archivado_en": registro.archivado_en,
+    }
+
+
+@registrar_tarea("escaneo_calidad", schemas.JobEscaneoCalidadParams)
+def escaneo_calidad(db: Session, parametros: dict, ctx: ContextoJob):
+    tablas = parametros.get("tablas") or list(crud_calidad.TABLAS_CALIDAD)
+    resultado = {"ciclo": None, "filas_escaneadas": 0, "hallazgos": []}
+    for i, tabla in enumerate(tablas):
+        ctx.progreso(i / len(tablas), f"Escaneando {tabla}")
+        parcial = crud_calidad.escanear(
+            db, tablas=[tabla], ciclo=parametros.get("ciclo")
+        )
+        resultado["ciclo"] = parcial["ciclo"]
+        resultado["filas_escaneadas"] += parcial["filas_escaneadas"]
+        resultado["hallazgos"].extend(parcial["hallazgos"])
+    return resultado
+
+
+@registrar_tarea("formulacion", formulacion_schemas.FormulacionRequest)
+def formulacion(db: Session, parametros: dict, ctx: ContextoJob):
+    solicitud = formulacion_schemas.FormulacionRequest(**parametros)
+    ctx.progreso(0.0, f"Formulando ciclo '{solicitud.ciclo}'")
+    return crud_formulacion.optimizar_formulacion(
+        db, solicitud, avance=lambda fraccion: ctx.progreso(fraccion)
+    )
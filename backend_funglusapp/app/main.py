@@ -1,25 +1,90 @@
 # backend_funglusapp/app/main.py
+from contextlib import asynccontextmanager
+
+from app.core import pool
 from app.core.config import settings
-from app.db import database, models
-from app.routers import (  # Solo estos dos routers ahora
+from app.crud import crud_cache_eventos, crud_claves, crud_escritura_diferida
+from app.crud.crud_archivo import CicloArchivadoError
+from app.crud.crud_calidad import DatosFueraDeRangoError
+from app.db import database, dimensiones, migraciones, models
+from app.jobs import planificador
+from app.routers import (
+    archivo_router,
+    calidad_router,
     ciclo_data_router,
+    claves_router,
+    formulacion_router,
+    jobs_router,
     laboratorio_router,
 )
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def preparar_base_de_datos() -> None:
+    """
+    Aplica las migraciones y crea las tablas que falten. Con un solo proceso se
+    llama al arrancar la aplicación; con varios workers lo hace una sola vez el
+    proceso padre (app/__main__.py) antes de lanzarlos.
+    """
+    try:
+        migraciones.aplicar_migraciones(database.engine)
+        models.Base.metadata.create_all(bind=database.engine)
+        print(
+            "INFO:     Conexión a la base de datos exitosa y tablas verificadas/creadas."
+        )
+    except Exception as e:
+        print(f"ERROR:    Error al conectar o crear tablas en la base de datos: {e}")
+        # raise e
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.WORKERS == 1:
+        preparar_base_de_datos()
+    # Con varios workers se escucha a los demás antes de llenar las cachés, para no
+    # perder avisos de escrituras hechas mientras se construyen
+    crud_cache_eventos.iniciar()
+    dimensiones.precargar(models.DIMENSIONES.values())
+    db = database.SessionLocal()
+    try:
+        crud_claves.construir_indice(db)
+    finally:
+        db.close()
+    # Antes que los jobs: si quedó un diario de una caída se reaplica primero
+    crud_escritura_diferida.iniciar()
+    planificador.iniciar()
+    yield
+    crud_escritura_diferida.detener()
+    planificador.detener()
+    pool.shutdown_process_pool()
+    crud_cache_eventos.detener()
 
-try:
-    models.Base.metadata.create_all(bind=database.engine)
-    print("INFO:     Conexión a la base de datos exitosa y tablas verificadas/creadas.")
-except Exception as e:
-    print(f"ERROR:    Error al conectar o crear tablas en la base de datos: {e}")
-    # raise e
 
-app = FastAPI(title=settings.APP_NAME, openapi_url="/api/v1/openapi.json")
+app = FastAPI(
+    title=settings.APP_NAME, openapi_url="/api/v1/openapi.json", lifespan=lifespan
+)
 
 # Incluir los routers
 app.include_router(ciclo_data_router.router, prefix="/api/v1")
 app.include_router(laboratorio_router.router, prefix="/api/v1")
-# La línea para formulacion_router.router ha sido eliminada.
+app.include_router(archivo_router.router, prefix="/api/v1")
+app.include_router(calidad_router.router, prefix="/api/v1")
+app.include_router(formulacion_router.router, prefix="/api/v1")
+app.include_router(jobs_router.router, prefix="/api/v1")
+app.include_router(claves_router.router, prefix="/api/v1")
+
+
+@app.exception_handler(CicloArchivadoError)
+def ciclo_archivado_handler(request: Request, exc: CicloArchivadoError):
+    # Cualquier intento de escribir en un ciclo archivado responde 409 Conflict
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+
+@app.exception_handler(DatosFueraDeRangoError)
+def datos_fuera_de_rango_handler(request: Request, exc: DatosFueraDeRangoError):
+    # Solo ocurre con settings.CALIDAD_VALIDAR_EN_PUT activo
+    return JSONResponse(status_code=422, content={"detail": exc.hallazgos})
 
 
 @app.get("/api/v1/health", tags=["Health"])
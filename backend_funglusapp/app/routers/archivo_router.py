@@ -0,0 +1,34 @@
+# backend_funglusapp/app/routers/archivo_router.py
+from typing import List
+
+from app.crud import crud_archivo
+from app.db import database
+from app.schemas import archivo_schemas as schemas
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+router = APIRouter(
+    prefix="/archivo",
+    tags=["Archivo de Ciclos"],
+)
+
+
+@router.get("/", response_model=List[schemas.CicloArchivadoInDB])
+def list_ciclos_archivados(db: Session = Depends(database.get_db)):
+    """Índice de ciclos archivados y el archivo donde vive cada uno."""
+    return crud_archivo.get_ciclos_archivados(db)
+
+
+@router.post("/{ciclo}", response_model=schemas.CicloArchivadoInDB)
+def archivar_ciclo(ciclo: str, db: Session = Depends(database.get_db)):
+    """
+    Cierra un ciclo: mueve sus filas de Materia Prima, Gubys y Tamo Húmedo a un
+    archivo comprimido de solo lectura. Los GET siguen devolviendo esas filas.
+    """
+    registro = crud_archivo.archivar_ciclo(db, ciclo)
+    if not registro:
+        raise HTTPException(
+            status_code=404,
+            detail=f"El ciclo '{ciclo.strip().upper()}' no tiene entradas para archivar.",
+        )
+    return registro
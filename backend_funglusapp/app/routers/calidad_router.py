@@ -0,0 +1,34 @@
+# backend_funglusapp/app/routers/calidad_router.py
+import time
+from typing import List, Literal, Optional
+
+from app.crud import crud_calidad
+from app.db import database
+from app.schemas import calidad_schemas as schemas
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+router = APIRouter(
+    prefix="/calidad",
+    tags=["Calidad de Datos"],
+)
+
+
+@router.get("/escaneo", response_model=schemas.ReporteCalidad)
+def escanear_calidad(
+    ciclo: Optional[str] = None,
+    tabla: Optional[List[Literal["materia_prima", "gubys", "tamo_humedo"]]] = Query(
+        None
+    ),
+    db: Session = Depends(database.get_db),
+):
+    """
+    Escanea las mediciones de laboratorio buscando valores fuera de rango, pesos
+    invertidos (p2h2 > p1h1) y atípicos por origen (mediana/MAD entre ciclos).
+    Sin `ciclo` recorre toda la historia, incluidos los ciclos archivados.
+    Los resultados quedan en caché por ciclo hasta la siguiente escritura.
+    """
+    inicio = time.perf_counter()
+    reporte = crud_calidad.escanear(db, tablas=tabla, ciclo=ciclo)
+    reporte["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+    return reporte
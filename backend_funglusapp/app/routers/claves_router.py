@@ -0,0 +1,50 @@
+# backend_funglusapp/app/routers/claves_router.py
+from typing import Literal, Optional
+
+from app.crud import crud_claves
+from app.db import database
+from app.schemas import claves_schemas as schemas
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+router = APIRouter(
+    prefix="/claves",
+    tags=["Claves - Autocompletar"],
+)
+
+
+@router.get("/sugerencias", response_model=schemas.SugerenciasClaves)
+def sugerir_claves(
+    tabla: Literal["materia_prima", "gubys", "tamo_humedo"],
+    campo: Literal["origen", "muestra"],
+    prefijo: str = "",
+    ciclo: Optional[str] = None,
+    limite: int = Query(10, ge=1, le=crud_claves.MAX_SUGERENCIAS),
+    db: Session = Depends(database.get_db),
+):
+    """
+    Valores de origen/muestra ya usados que empiezan por `prefijo`, los más
+    frecuentes primero. Con `ciclo` se limita a los valores de ese ciclo.
+    """
+    if campo not in crud_claves.TABLAS_CLAVES[tabla][1]:
+        raise HTTPException(
+            status_code=400, detail=f"La tabla '{tabla}' no tiene el campo '{campo}'."
+        )
+    sugerencias = crud_claves.sugerir_claves(
+        db, tabla, campo, prefijo=prefijo, ciclo=ciclo, limite=limite
+    )
+    return {
+        "tabla": tabla,
+        "campo": campo,
+        "prefijo": prefijo.strip().upper(),
+        "ciclo": ciclo.strip().upper() if ciclo else None,
+        "sugerencias": [
+            {"valor": valor, "ciclos": ciclos} for valor, ciclos in sugerencias
+        ],
+    }
+
+
+@router.get("/estadisticas", response_model=schemas.EstadisticasIndiceClaves)
+def estadisticas_indice_claves():
+    """Tamaño del índice en memoria (número de valores y bytes aproximados)."""
+    return crud_claves.indice.estadisticas()
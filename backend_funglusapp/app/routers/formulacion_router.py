@@ -0,0 +1,26 @@
+# backend_funglusapp/app/routers/formulacion_router.py
+from app.crud import crud_formulacion
+from app.db import database
+from app.schemas import formulacion_schemas as schemas
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+router = APIRouter(
+    prefix="/formulacion",
+    tags=["Formulación"],
+)
+
+
+@router.post("/optimizar", response_model=schemas.FormulacionResultado)
+def optimizar_formulacion(
+    solicitud: schemas.FormulacionRequest, db: Session = Depends(database.get_db)
+):
+    """
+    Calcula las proporciones de ingredientes que mejor alcanzan la humedad y el pH
+    objetivo con los valores de laboratorio del ciclo. Devuelve las `top` recetas
+    de menor error; el resultado queda en caché hasta que cambien los datos del ciclo.
+    """
+    try:
+        return crud_formulacion.optimizar_formulacion(db, solicitud)
+    except crud_formulacion.FormulacionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,57 @@
+# backend_funglusapp/app/routers/jobs_router.py
+from typing import List, Optional
+
+from app.crud import crud_jobs
+from app.db import database
+from app.jobs import planificador
+from app.schemas import jobs_schemas as schemas
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+)
+
+
+@router.post("/", response_model=schemas.JobInDB, status_code=202)
+def submit_job(job_in: schemas.JobCreate, db: Session = Depends(database.get_db)):
+    """
+    Encola un trabajo pesado (archivar_ciclo, escaneo_calidad, formulacion) para
+    ejecutarlo fuera de la petición. Consulta su avance con GET /jobs/{id}.
+    """
+    try:
+        return planificador.enviar_job(db, job_in.tipo, job_in.parametros)
+    except planificador.TipoJobDesconocido as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422, detail=e.errors(include_url=False, include_context=False)
+        )
+
+
+@router.get("/", response_model=List[schemas.JobInDB])
+def list_jobs(
+    estado: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(database.get_db),
+):
+    return crud_jobs.get_jobs(db, estado=estado, skip=skip, limit=limit)
+
+
+@router.get("/{job_id}", response_model=schemas.JobInDB)
+def read_job(job_id: int, db: Session = Depends(database.get_db)):
+    job = crud_jobs.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job no encontrado.")
+    return job
+
+
+@router.post("/{job_id}/cancelar", response_model=schemas.JobInDB)
+def cancel_job(job_id: int, db: Session = Depends(database.get_db)):
+    job = crud_jobs.solicitar_cancelacion(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job no encontrado.")
+    return job
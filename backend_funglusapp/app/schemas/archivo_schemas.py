@@ -0,0 +1,12 @@
+# backend_funglusapp/app/schemas/archivo_schemas.py
+from pydantic import BaseModel
+
+
+class CicloArchivadoInDB(BaseModel):
+    ciclo: str
+    ruta: str
+    filas: int
+    archivado_en: str
+
+    class Config:
+        from_attributes = True
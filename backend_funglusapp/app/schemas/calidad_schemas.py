@@ -0,0 +1,23 @@
+# backend_funglusapp/app/schemas/calidad_schemas.py
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class HallazgoCalidad(BaseModel):
+    tabla: str  # materia_prima, gubys o tamo_humedo
+    key: int
+    ciclo: str
+    origen: str
+    muestra: Optional[str] = None  # Solo Materia Prima
+    campo: str
+    valor: Optional[float] = None
+    regla: str  # rango, pesos o atipico
+    detalle: str
+
+
+class ReporteCalidad(BaseModel):
+    ciclo: Optional[str] = None  # None = historia completa
+    filas_escaneadas: int
+    hallazgos: List[HallazgoCalidad]
+    duracion_ms: float
@@ -0,0 +1,23 @@
+# backend_funglusapp/app/schemas/claves_schemas.py
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class SugerenciaClave(BaseModel):
+    valor: str
+    ciclos: int  # Número de ciclos en que aparece (criterio de ranking)
+
+
+class SugerenciasClaves(BaseModel):
+    tabla: str
+    campo: str
+    prefijo: str
+    ciclo: Optional[str] = None
+    sugerencias: List[SugerenciaClave]
+
+
+class EstadisticasIndiceClaves(BaseModel):
+    valores_por_tabla: Dict[str, int]
+    indices_por_ciclo: int
+    bytes_aproximados: int
@@ -0,0 +1,73 @@
+# backend_funglusapp/app/schemas/formulacion_schemas.py
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+
+class FormulacionRequest(BaseModel):
+    ciclo: str
+    humedad_objetivo: float = Field(..., ge=0, le=100)
+    ph_objetivo: float = Field(..., ge=0, le=14)
+    # Nombres de ingrediente (muestra de Materia Prima o TAMO_HUMEDO); None = todos
+    ingredientes: Optional[List[str]] = None
+    incluir_agua: bool = True
+    paso: float = Field(0.05, gt=0, le=0.5)  # Resolución de las proporciones
+    minimos: Dict[str, float] = {}  # Proporción mínima por ingrediente (0-1)
+    maximos: Dict[str, float] = {}  # Proporción máxima por ingrediente (0-1)
+    tolerancia_humedad: float = Field(1.0, gt=0)  # Puntos de humedad que pesan 1
+    tolerancia_ph: float = Field(0.1, gt=0)  # Unidades de pH que pesan 1
+    top: int = Field(10, ge=1, le=100)
+
+    @field_validator("paso")
+    @classmethod
+    def paso_divide_a_uno(cls, v: float) -> float:
+        # La rejilla usa round(1 / paso) divisiones: con otro paso cambiaría en silencio
+        divisiones = round(1 / v)
+        if abs(divisiones * v - 1) > 1e-6:
+            raise ValueError(
+                "paso debe dividir 1 en partes iguales (p. ej. 0.05, 0.1, 0.25)"
+            )
+        return v
+
+    @field_validator("minimos", "maximos")
+    @classmethod
+    def proporciones_entre_0_y_1(cls, v: Dict[str, float]) -> Dict[str, float]:
+        fuera = sorted(nombre for nombre, valor in v.items() if not 0 <= valor <= 1)
+        if fuera:
+            raise ValueError(f"las proporciones deben estar entre 0 y 1: {fuera}")
+        return v
+
+    @model_validator(mode="after")
+    def minimos_no_superan_maximos(self) -> "FormulacionRequest":
+        # Los nombres se comparan limpios, como los usa la formulación
+        maximos = {k.strip().upper(): v for k, v in self.maximos.items()}
+        invertidos = sorted(
+            nombre
+            for nombre, minimo in self.minimos.items()
+            if minimo > maximos.get(nombre.strip().upper(), 1.0)
+        )
+        if invertidos:
+            raise ValueError(f"mínimo mayor que el máximo para: {invertidos}")
+        return self
+
+
+class IngredienteFormulacion(BaseModel):
+    nombre: str
+    hprom: float
+    ph: float
+    filas: int  # Entradas de laboratorio promediadas
+
+
+class RecetaCandidata(BaseModel):
+    proporciones: Dict[str, float]
+    humedad: float
+    ph: float
+    error: float
+
+
+class FormulacionResultado(BaseModel):
+    ciclo: str
+    ingredientes: List[IngredienteFormulacion]
+    candidatos_evaluados: int
+    recetas: List[RecetaCandidata]
+    desde_cache: bool
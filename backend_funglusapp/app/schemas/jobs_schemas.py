@@ -0,0 +1,44 @@
+# backend_funglusapp/app/schemas/jobs_schemas.py
+import json
+from typing import Any, List, Literal, Optional
+
+from pydantic import BaseModel, field_validator
+
+
+class JobCreate(BaseModel):
+    tipo: str  # archivar_ciclo, escaneo_calidad o formulacion
+    parametros: dict = {}
+
+
+class JobInDB(BaseModel):
+    id: int
+    tipo: str
+    estado: str  # pendiente, en_curso, completado, fallido o cancelado
+    progreso: float
+    mensaje: Optional[str] = None
+    parametros: Optional[Any] = None
+    resultado: Optional[Any] = None
+    error: Optional[str] = None
+    cancelar: bool
+    creado_en: str
+    iniciado_en: Optional[str] = None
+    finalizado_en: Optional[str] = None
+
+    @field_validator("parametros", "resultado", mode="before")
+    @classmethod
+    def _parsear_json(cls, valor):
+        # En la BD se guardan como texto JSON
+        return json.loads(valor) if isinstance(valor, str) else valor
+
+    class Config:
+        from_attributes = True
+
+
+# --- Parámetros de cada tipo de job ---
+class JobArchivarCicloParams(BaseModel):
+    ciclo: str
+
+
+class JobEscaneoCalidadParams(BaseModel):
+    ciclo: Optional[str] = None
+    tablas: Optional[List[Literal["materia_prima", "gubys", "tamo_humedo"]]] = None
@@ -0,0 +1,128 @@
+# backend_funglusapp/benchmarks/bench_calidad.py
+"""
+Mide el escaneo de calidad (crud_calidad._escanear) sobre historiales sintéticos
+de Materia Prima con muchos grupos (origen/muestra), que es donde el coste por
+grupo se nota.
+
+Uso (desde backend_funglusapp):  python -m benchmarks.bench_calidad
+
+Cada corrida genera `filas` filas repartidas en `grupos` orígenes, con un 5 % de
+valores vacíos y un 1 % de valores sucios (atípicos y fuera de rango). Al final
+compara los atípicos con un cálculo de referencia grupo a grupo (np.nanmedian)
+sobre un historial con muchos grupos pequeños, incluidos grupos por debajo de
+MIN_MUESTRAS_GRUPO y columnas sin datos. No usa la BD.
+"""
+
+import contextlib
+import io
+import time
+
+import numpy as np
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from app.crud import crud_calidad
+    from app.db import models
+
+CORRIDAS = [
+    (100_000, 100),
+    (100_000, 1_000),
+    (100_000, 10_000),
+    (400_000, 20_000),
+    (1_000_000, 50_000),
+]
+MUESTRAS = ("TAMO", "GALLINAZA", "CASCARILLA")
+
+
+def _datos(filas: int, grupos: int, semilla: int = 0, sucios: float = 0.01) -> dict:
+    aleatorio = np.random.default_rng(semilla)
+    datos = {}
+    for campo in crud_calidad._campos(models.MateriaPrima):
+        inferior, superior = crud_calidad.RANGOS[campo]
+        superior = 100.0 if superior is None else superior
+        centro, escala = (inferior + superior) / 2, (superior - inferior) / 20
+        valores = np.round(aleatorio.normal(centro, escala, filas), 1)
+        valores[aleatorio.random(filas) < 0.05] = np.nan
+        sucias = aleatorio.random(filas) < sucios
+        valores[sucias] = centro + escala * aleatorio.choice(
+            [-30, 12, 40], sucias.sum()
+        )
+        datos[campo] = valores
+    # Tras el secado el peso baja (si no, la regla de pesos marcaría media tabla)
+    datos["p2h2"] = np.round(datos["p1h1"] * 0.8, 1)
+    origenes = aleatorio.integers(0, grupos // len(MUESTRAS) + 1, filas)
+    datos["key"] = np.arange(1, filas + 1)
+    datos["ciclo"] = np.array(
+        [f"CICLO_{k % 200:04d}" for k in range(filas)], dtype=object
+    )
+    datos["origen"] = np.array([f"PROVEEDOR_{o:06d}" for o in origenes], dtype=object)
+    datos["muestra"] = np.array(
+        [MUESTRAS[k] for k in aleatorio.integers(0, len(MUESTRAS), filas)], dtype=object
+    )
+    return datos
+
+
+def _atipicos_referencia(datos: dict) -> set:
+    """Atípicos calculados grupo a grupo con np.nanmedian (lento, solo para comprobar)."""
+    campos = crud_calidad._campos(models.MateriaPrima)
+    matriz = np.column_stack([datos[c] for c in campos])
+    inferiores = np.array([crud_calidad.RANGOS[c][0] for c in campos])
+    superiores = np.array(
+        [crud_calidad.RANGOS[c][1] or np.inf for c in campos], dtype=float
+    )
+    fuera_rango = (matriz < inferiores) | (matriz > superiores)
+    limpia = np.where(fuera_rango, np.nan, matriz)
+    grupos = np.array(
+        [f"{m}/{o}" for m, o in zip(datos["muestra"], datos["origen"])], dtype=object
+    )
+    atipicos = set()
+    for grupo in np.unique(grupos):
+        indices = np.flatnonzero(grupos == grupo)
+        for columna, campo in enumerate(campos):
+            valores = limpia[indices, columna]
+            if np.sum(~np.isnan(valores)) < crud_calidad.MIN_MUESTRAS_GRUPO:
+                continue
+            mediana = np.nanmedian(valores)
+            mad = np.nanmedian(np.abs(valores - mediana))
+            if mad == 0:
+                continue
+            z = 0.6745 * (matriz[indices, columna] - mediana) / mad
+            for fila in indices[np.abs(np.nan_to_num(z)) > crud_calidad.UMBRAL_Z]:
+                if not fuera_rango[fila, columna]:
+                    atipicos.add((int(datos["key"][fila]), campo))
+    return atipicos
+
+
+def medir() -> None:
+    print("Escaneo de calidad (_escanear) sobre Materia Prima sintética")
+    for filas, grupos in CORRIDAS:
+        datos = _datos(filas, grupos)
+        inicio = time.perf_counter()
+        hallazgos = crud_calidad._escanear("materia_prima", models.MateriaPrima, datos)
+        print(
+            f"  {filas:>9} filas, {grupos:>6} grupos: "
+            f"{time.perf_counter() - inicio:6.2f} s ({len(hallazgos)} hallazgos)"
+        )
+
+
+def comprobar() -> None:
+    print("Comprobaciones")
+    # ~3.000 grupos de unas 7 filas: muchos por debajo del mínimo, otros con 15+
+    datos = _datos(20_000, 3_000, semilla=1, sucios=0.05)
+    datos["ph"][datos["origen"] == datos["origen"][0]] = np.nan  # Columna sin datos
+    hallazgos = crud_calidad._escanear("materia_prima", models.MateriaPrima, datos)
+    obtenidos = {(h["key"], h["campo"]) for h in hallazgos if h["regla"] == "atipico"}
+    esperados = _atipicos_referencia(datos)
+    correcto = obtenidos == esperados and len(esperados) > 0
+    print(
+        f"  atípicos con muchos grupos iguales a la referencia "
+        f"({len(esperados)}): {'OK' if correcto else 'FALLO'}"
+    )
+
+
+def main() -> None:
+    medir()
+    comprobar()
+
+
+if __name__ == "__main__":
+    main()
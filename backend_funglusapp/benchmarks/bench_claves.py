@@ -0,0 +1,185 @@
+# backend_funglusapp/benchmarks/bench_claves.py
+"""
+Mide el índice de autocompletar de claves (crud_claves): construcción, memoria y
+latencia de consulta, y la latencia de /claves/sugerencias mientras el índice se
+reconstruye en segundo plano.
+
+Uso (desde backend_funglusapp):  python -m benchmarks.bench_claves [claves] [filas]
+
+1. Un índice de tabla (_ListaPrefijos) con `claves` valores aleatorios de 6-12
+   letras (1.000.000 por defecto): construcción, memoria (tracemalloc), consulta
+   por prefijo, actualización de conteo e inserción de una clave nueva.
+2. El índice completo sobre una BD temporal con `filas` filas de Materia Prima
+   (200.000 por defecto): se marca obsoleto y se consultan sugerencias mientras
+   otro hilo lo reconstruye. No toca la BD real.
+"""
+
+import contextlib
+import io
+import os
+import random
+import shutil
+import statistics
+import string
+import sys
+import tempfile
+import time
+import tracemalloc
+
+CLAVES = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+FILAS = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+CONSULTAS = 20_000
+
+_DIRECTORIO = tempfile.mkdtemp(prefix="bench_claves_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DIRECTORIO, 'bench.db')}"
+os.environ["ARCHIVO_DIR"] = os.path.join(_DIRECTORIO, "archivo")
+
+from app.core import eventos  # noqa: E402
+from app.crud import crud_claves  # noqa: E402
+from app.db import database, dimensiones, models  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+
+def _clave(aleatorio: random.Random) -> str:
+    largo = aleatorio.randint(6, 12)
+    return "".join(aleatorio.choices(string.ascii_uppercase, k=largo))
+
+
+def _percentiles(tiempos) -> str:
+    tiempos = sorted(tiempos)
+    p99 = tiempos[int(len(tiempos) * 0.99)]
+    return (
+        f"mediana {statistics.median(tiempos) * 1e6:.1f} µs, "
+        f"p99 {p99 * 1e6:.1f} µs, máx {tiempos[-1] * 1e3:.2f} ms"
+    )
+
+
+def medir_lista() -> None:
+    print(f"1) Índice de una tabla con {CLAVES} claves")
+    aleatorio = random.Random(0)
+    # La memoria incluye las cadenas de las claves, que el índice mantiene vivas
+    tracemalloc.start()
+    valores = [_clave(aleatorio) for _ in range(CLAVES)]
+    inicio = time.perf_counter()
+    lista = crud_claves._ListaPrefijos()
+    for valor in valores:
+        lista.conteos[valor] = lista.conteos.get(valor, 0) + aleatorio.randint(1, 5)
+    lista.valores = sorted(lista.conteos)
+    lista.precalcular()
+    construccion = time.perf_counter() - inicio
+    del valores
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  construcción: {construccion:.2f} s, memoria: {memoria / 1e6:.0f} MB")
+
+    prefijos = [
+        "".join(aleatorio.choices(string.ascii_uppercase, k=aleatorio.randint(0, 4)))
+        for _ in range(CONSULTAS)
+    ]
+    tiempos = []
+    for prefijo in prefijos:
+        inicio = time.perf_counter()
+        lista.buscar(prefijo, 10)
+        tiempos.append(time.perf_counter() - inicio)
+    print(f"  consulta por prefijo: {_percentiles(tiempos)}")
+
+    existentes = aleatorio.sample(lista.valores, 2_000)
+    tiempos = []
+    for valor in existentes:
+        inicio = time.perf_counter()
+        lista.incrementar(valor)
+        tiempos.append(time.perf_counter() - inicio)
+    print(f"  conteo de una clave existente: {_percentiles(tiempos)}")
+
+    tiempos = []
+    for _ in range(2_000):
+        valor = _clave(aleatorio) + "Z"
+        inicio = time.perf_counter()
+        lista.incrementar(valor)
+        tiempos.append(time.perf_counter() - inicio)
+    print(f"  clave nueva: {_percentiles(tiempos)}")
+
+
+def _crear_bd() -> None:
+    models.Base.metadata.create_all(bind=database.engine)
+    aleatorio = random.Random(1)
+    ciclos = [
+        dimensiones.obtener_id(models.DimCiclo, f"CICLO_{c:04d}", crear=True)
+        for c in range(200)
+    ]
+    muestras = [
+        dimensiones.obtener_id(models.DimMuestra, f"MUESTRA_{m:02d}", crear=True)
+        for m in range(10)
+    ]
+    origenes = {}
+    filas = set()
+    while len(filas) < FILAS:
+        origen = f"PROVEEDOR_{aleatorio.randint(0, FILAS // 20):06d}"
+        if origen not in origenes:
+            origenes[origen] = dimensiones.obtener_id(
+                models.DimOrigen, origen, crear=True
+            )
+        filas.add(
+            (
+                aleatorio.choice(ciclos),
+                origenes[origen],
+                aleatorio.choice(muestras),
+            )
+        )
+    with database.engine.begin() as conexion:
+        conexion.execute(
+            insert(models.MateriaPrima),
+            [
+                {"ciclo_id": c, "origen_id": o, "muestra_id": m}
+                for c, o, m in sorted(filas)
+            ],
+        )
+
+
+def medir_reconstruccion() -> None:
+    print(f"2) Índice completo sobre {FILAS} filas de Materia Prima")
+    with contextlib.redirect_stdout(io.StringIO()):
+        _crear_bd()
+        db = database.SessionLocal()
+        inicio = time.perf_counter()
+        crud_claves.construir_indice(db)
+    print(f"  construcción al arrancar: {time.perf_counter() - inicio:.2f} s")
+
+    def consultar(cuantas: int):
+        tiempos = []
+        for i in range(cuantas):
+            inicio = time.perf_counter()
+            crud_claves.sugerir_claves(
+                db, "materia_prima", "origen", f"PROVEEDOR_{i % 100:02d}"
+            )
+            tiempos.append(time.perf_counter() - inicio)
+        return tiempos
+
+    print(f"  consulta sin reconstrucción: {_percentiles(consultar(2_000))}")
+
+    # Lo que ocurre tras un job en subproceso o un hueco en el canal entre workers
+    eventos.invalidar_todo()
+    tiempos = []
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        tiempos.extend(consultar(1))  # Esta consulta lanza la reconstrucción
+        hilo = crud_claves.indice._hilo
+        while hilo is not None and hilo.is_alive():
+            tiempos.extend(consultar(50))
+    reconstruccion = time.perf_counter() - inicio
+    print(
+        f"  durante la reconstrucción en segundo plano ({reconstruccion:.2f} s, "
+        f"{len(tiempos)} consultas): {_percentiles(tiempos)}"
+    )
+    db.close()
+
+
+def main() -> None:
+    medir_lista()
+    medir_reconstruccion()
+    database.engine.dispose()
+    shutil.rmtree(_DIRECTORIO, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
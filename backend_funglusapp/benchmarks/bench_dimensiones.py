@@ -0,0 +1,210 @@
+# backend_funglusapp/benchmarks/bench_dimensiones.py
+"""
+Mide tamaño de la BD y latencia de búsqueda por claves antes y después de la
+migración a tablas de dimensión (app/db/migraciones.py).
+
+Uso (desde backend_funglusapp):  python -m benchmarks.bench_dimensiones [ciclos]
+
+Crea una BD temporal con el esquema anterior (claves en texto con un índice por
+columna), la mide, la migra con el mismo código que corre al arrancar y la vuelve
+a medir. Comprueba además que la migración conserva cada fila con su key y sus
+claves, y que la secuencia de keys queda por encima de las keys existentes. No
+toca la BD real.
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+CICLOS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+ORIGENES_POR_CICLO = 40
+MUESTRAS = [f"MUESTRA_{i:02d}" for i in range(12)]
+BUSQUEDAS = 20_000
+
+_DIRECTORIO = tempfile.mkdtemp(prefix="bench_dimensiones_")
+_RUTA_BD = os.path.join(_DIRECTORIO, "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{_RUTA_BD}"
+
+from app.db import database, dimensiones, migraciones, models  # noqa: E402
+
+_ESQUEMA_ANTERIOR = """
+CREATE TABLE lab_materia_prima (
+    "key" INTEGER NOT NULL, ciclo VARCHAR NOT NULL, origen VARCHAR NOT NULL,
+    muestra VARCHAR NOT NULL, fecha_i VARCHAR, fecha_p VARCHAR, p1h1 FLOAT,
+    p2h2 FLOAT, porc_h1 FLOAT, porc_h2 FLOAT, p_ph FLOAT, ph FLOAT, d1 FLOAT,
+    d2 FLOAT, d3 FLOAT, hprom FLOAT, dprom FLOAT, PRIMARY KEY ("key"),
+    CONSTRAINT _mp_ciclo_origen_muestra_uc UNIQUE (ciclo, origen, muestra));
+CREATE INDEX ix_lab_materia_prima_key ON lab_materia_prima ("key");
+CREATE INDEX ix_lab_materia_prima_ciclo ON lab_materia_prima (ciclo);
+CREATE INDEX ix_lab_materia_prima_origen ON lab_materia_prima (origen);
+CREATE INDEX ix_lab_materia_prima_muestra ON lab_materia_prima (muestra);
+CREATE TABLE lab_gubys (
+    "key" INTEGER NOT NULL, ciclo VARCHAR NOT NULL, origen VARCHAR NOT NULL,
+    fecha_i VARCHAR, fecha_p VARCHAR, p1h1 FLOAT, p2h2 FLOAT, porc_h1 FLOAT,
+    porc_h2 FLOAT, p_ph FLOAT, ph FLOAT, hprom FLOAT, PRIMARY KEY ("key"),
+    CONSTRAINT _gubys_ciclo_origen_uc UNIQUE (ciclo, origen));
+CREATE INDEX ix_lab_gubys_key ON lab_gubys ("key");
+CREATE INDEX ix_lab_gubys_ciclo ON lab_gubys (ciclo);
+CREATE INDEX ix_lab_gubys_origen ON lab_gubys (origen);
+CREATE TABLE lab_tamo_humedo (
+    "key" INTEGER NOT NULL, ciclo VARCHAR NOT NULL, origen VARCHAR NOT NULL,
+    fecha_i VARCHAR, fecha_p VARCHAR, p1h1 FLOAT, p2h2 FLOAT, porc_h1 FLOAT,
+    porc_h2 FLOAT, p_ph FLOAT, ph FLOAT, d1 FLOAT, d2 FLOAT, d3 FLOAT,
+    hprom FLOAT, dprom FLOAT, PRIMARY KEY ("key"),
+    CONSTRAINT _tamo_humedo_ciclo_origen_uc UNIQUE (ciclo, origen));
+CREATE INDEX ix_lab_tamo_humedo_key ON lab_tamo_humedo ("key");
+CREATE INDEX ix_lab_tamo_humedo_ciclo ON lab_tamo_humedo (ciclo);
+CREATE INDEX ix_lab_tamo_humedo_origen ON lab_tamo_humedo (origen);
+"""
+
+
+def _claves():
+    for c in range(CICLOS):
+        ciclo = f"CICLO_{2020 + c // 50}_{c:04d}"
+        for o in range(ORIGENES_POR_CICLO):
+            yield ciclo, f"PROVEEDOR_FINCA_{o:03d}"
+
+
+def _crear_bd_anterior() -> None:
+    aleatorio = random.Random(0)
+    conexion = sqlite3.connect(_RUTA_BD)
+    conexion.executescript(_ESQUEMA_ANTERIOR)
+    datos = lambda: [round(aleatorio.uniform(1, 100), 2) for _ in range(11)]  # noqa
+    conexion.executemany(
+        "INSERT INTO lab_materia_prima (ciclo, origen, muestra, p1h1, p2h2, porc_h1,"
+        " porc_h2, p_ph, ph, d1, d2, d3, hprom, dprom) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+        ((c, o, m, *datos()) for c, o in _claves() for m in MUESTRAS),
+    )
+    for tabla in ("lab_gubys", "lab_tamo_humedo"):
+        conexion.executemany(
+            f"INSERT INTO {tabla} (ciclo, origen, p1h1, p2h2, porc_h1, porc_h2, ph)"
+            " VALUES (?,?,?,?,?,?,?)",
+            ((c, o, *datos()[:5]) for c, o in _claves()),
+        )
+    conexion.commit()
+    conexion.execute("VACUUM")
+    conexion.close()
+
+
+def _muestra_busquedas():
+    aleatorio = random.Random(1)
+    claves = list(_claves())
+    return [
+        (*aleatorio.choice(claves), aleatorio.choice(MUESTRAS))
+        for _ in range(BUSQUEDAS)
+    ]
+
+
+def _filas_por_key(sql: str) -> dict:
+    conexion = sqlite3.connect(_RUTA_BD)
+    try:
+        return {fila[0]: fila[1:] for fila in conexion.execute(sql)}
+    finally:
+        conexion.close()
+
+
+_CONSULTA_TEXTO = (
+    "SELECT key, ciclo, origen, muestra, ph, dprom FROM lab_materia_prima",
+    "SELECT key, ciclo, origen, ph FROM lab_gubys",
+)
+_CONSULTA_IDS = (
+    "SELECT m.key, c.valor, o.valor, d.valor, m.ph, m.dprom FROM lab_materia_prima m"
+    " JOIN dim_ciclo c ON c.id = m.ciclo_id JOIN dim_origen o ON o.id = m.origen_id"
+    " JOIN dim_muestra d ON d.id = m.muestra_id",
+    "SELECT g.key, c.valor, o.valor, g.ph FROM lab_gubys g"
+    " JOIN dim_ciclo c ON c.id = g.ciclo_id JOIN dim_origen o ON o.id = g.origen_id",
+)
+
+
+def _comprobar_migracion(antes: list) -> None:
+    despues = [_filas_por_key(sql) for sql in _CONSULTA_IDS]
+    conexion = sqlite3.connect(_RUTA_BD)
+    try:
+        secuencias = dict(conexion.execute("SELECT name, seq FROM sqlite_sequence"))
+    finally:
+        conexion.close()
+    for (tabla, filas_antes), filas_despues in zip(
+        (("lab_materia_prima", antes[0]), ("lab_gubys", antes[1])), despues
+    ):
+        correcto = filas_antes == filas_despues and secuencias.get(tabla, 0) >= max(
+            filas_antes
+        )
+        print(
+            f"  migración de {tabla}: {'OK' if correcto else 'FALLO'} "
+            f"({len(filas_despues)}/{len(filas_antes)} filas con la misma key y claves)"
+        )
+
+
+def _medir(titulo: str, buscar) -> None:
+    busquedas = _muestra_busquedas()
+    inicio = time.perf_counter()
+    for ciclo, origen, muestra in busquedas:
+        assert buscar(ciclo, origen, muestra) is not None
+    por_busqueda = (time.perf_counter() - inicio) / len(busquedas) * 1e6
+    print(f"  {titulo}: {por_busqueda:.1f} µs/búsqueda")
+
+
+def _medir_tamano(titulo: str) -> None:
+    print(f"{titulo}: {os.path.getsize(_RUTA_BD) / 1e6:.2f} MB en disco")
+    conexion = sqlite3.connect(_RUTA_BD)
+    try:
+        por_objeto = conexion.execute(
+            "SELECT m.type, SUM(s.pgsize) FROM dbstat s"
+            " JOIN sqlite_master m ON m.name = s.name GROUP BY m.type"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        por_objeto = []  # SQLite compilado sin dbstat
+    finally:
+        conexion.close()
+    for tipo, tamano in por_objeto:
+        print(f"  {tipo}: {tamano / 1e6:.2f} MB")
+
+
+def main() -> None:
+    print(f"BD temporal: {_RUTA_BD}")
+    _crear_bd_anterior()
+
+    _medir_tamano("Antes (claves en texto)")
+    conexion = sqlite3.connect(_RUTA_BD)
+    _medir(
+        "búsqueda por texto",
+        lambda c, o, m: conexion.execute(
+            "SELECT * FROM lab_materia_prima WHERE ciclo=? AND origen=? AND muestra=?",
+            (c, o, m),
+        ).fetchone(),
+    )
+    conexion.close()
+
+    antes = [_filas_por_key(sql) for sql in _CONSULTA_TEXTO]
+    inicio = time.perf_counter()
+    migraciones.aplicar_migraciones(database.engine)
+    print(f"Migración: {time.perf_counter() - inicio:.2f} s")
+    _comprobar_migracion(antes)
+
+    _medir_tamano("Después (IDs de dimensión)")
+    dimensiones.precargar(models.DIMENSIONES.values())
+    conexion = sqlite3.connect(_RUTA_BD)
+
+    def buscar_por_ids(ciclo, origen, muestra):
+        # Mismo camino que los CRUD: caché de IDs + índice compuesto de enteros
+        return conexion.execute(
+            "SELECT * FROM lab_materia_prima WHERE ciclo_id=? AND origen_id=? AND muestra_id=?",
+            (
+                dimensiones.obtener_id(models.DimCiclo, ciclo),
+                dimensiones.obtener_id(models.DimOrigen, origen),
+                dimensiones.obtener_id(models.DimMuestra, muestra),
+            ),
+        ).fetchone()
+
+    _medir("búsqueda por IDs (incluye caché)", buscar_por_ids)
+    conexion.close()
+    database.engine.dispose()
+    shutil.rmtree(_DIRECTORIO, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+# backend_funglusapp/benchmarks/bench_escritura_diferida.py
+"""
+Compara los PUT .../entry con commit inmediato frente a la escritura diferida
+(crud_escritura_diferida): PUT por segundo y fsyncs por segundo.
+
+Uso (desde backend_funglusapp):  python -m benchmarks.bench_escritura_diferida [filas]
+
+Simula formularios con guardado automático: cada fila recibe un PUT por campo,
+como cuando el usuario va pasando de un campo a otro. Se mide con 1 y con varios
+usuarios simultáneos. Los fsyncs se cuentan de dos formas:
+  - "diario": fsyncs hechos por el diario de escritura diferida (contados aquí);
+  - "disco": flushes completados por el dispositivo según /proc/diskstats (Linux),
+    que incluye los de SQLite. Cualquier otra actividad del equipo también suma.
+Al final comprueba la recuperación tras una caída (un proceso hijo encola PUT y
+muere sin volcar; este proceso reaplica el diario), que si ese diario no se puede
+volcar el arranque falla y el diario se conserva para el siguiente, el rechazo de
+PUT mientras se archiva un ciclo y que un cambio cuya fila ya no existe se conserva
+en "<diario>.sin_fila". Usa una BD temporal; no toca la BD real.
+"""
+
+import contextlib
+import glob
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+FILAS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+USUARIOS = (1, 8)
+
+_DIRECTORIO = tempfile.mkdtemp(prefix="bench_escritura_diferida_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DIRECTORIO, 'bench.db')}"
+os.environ["ESCRITURA_DIFERIDA_DIARIO"] = os.path.join(_DIRECTORIO, "diario")
+
+from app.core.config import settings  # noqa: E402
+from app.crud import crud_archivo  # noqa: E402
+from app.crud import crud_escritura_diferida, crud_laboratorio  # noqa: E402
+from app.db import database, models  # noqa: E402
+from sqlalchemy import delete, text  # noqa: E402
+from app.schemas import laboratorio_schemas as schemas  # noqa: E402
+
+# Un PUT por campo, en el orden en que se llenan en el formulario
+CAMPOS = [
+    ("p1h1", 12.5),
+    ("p2h2", 11.0),
+    ("porc_h1", 61.0),
+    ("porc_h2", 63.0),
+    ("p_ph", 10.0),
+    ("ph", 7.2),
+    ("d1", 1.1),
+    ("d2", 1.2),
+    ("d3", 1.3),
+]
+
+
+def _flushes_disco() -> int:
+    """Flushes completados por el disco donde está la BD (-1 si no se puede leer)."""
+    dispositivo = os.stat(_DIRECTORIO).st_dev
+    clave = (os.major(dispositivo), os.minor(dispositivo))
+    try:
+        with open("/proc/diskstats") as f:
+            for linea in f:
+                partes = linea.split()
+                if (int(partes[0]), int(partes[1])) == clave and len(partes) >= 19:
+                    return int(partes[18])
+    except OSError:
+        pass
+    return -1
+
+
+def _crear_filas(ciclo: str) -> None:
+    db = database.SessionLocal()
+    try:
+        for i in range(FILAS):
+            crud_laboratorio.get_or_create_materia_prima_entry(
+                db, ciclo, f"ORIGEN_{i:04d}", "TAMO"
+            )
+    finally:
+        db.close()
+
+
+def _usuario(ciclo: str, filas: range) -> None:
+    db = database.SessionLocal()
+    try:
+        for i in filas:
+            for campo, valor in CAMPOS:
+                crud_laboratorio.update_materia_prima_entry(
+                    db,
+                    ciclo,
+                    f"ORIGEN_{i:04d}",
+                    "TAMO",
+                    schemas.MateriaPrimaDataUpdate(**{campo: valor}),
+                )
+    finally:
+        db.close()
+
+
+def _medir(diferida: bool, usuarios: int) -> None:
+    ciclo = f"BENCH_{'DIFERIDA' if diferida else 'DIRECTA'}_{usuarios}"
+    settings.ESCRITURA_DIFERIDA = diferida
+    with contextlib.redirect_stdout(io.StringIO()):
+        _crear_filas(ciclo)
+        if diferida:
+            crud_escritura_diferida.iniciar()
+        diario = crud_escritura_diferida._diario
+        fsyncs_diario = diario.fsyncs if diario else 0
+        flushes = _flushes_disco()
+
+        hilos = [
+            threading.Thread(target=_usuario, args=(ciclo, range(u, FILAS, usuarios)))
+            for u in range(usuarios)
+        ]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        respuesta = time.perf_counter() - inicio
+        if diferida:
+            fsyncs_diario = diario.fsyncs - fsyncs_diario
+            crud_escritura_diferida.detener()  # Vuelco final incluido en el total
+        total = time.perf_counter() - inicio
+        flushes = _flushes_disco() - flushes if flushes >= 0 else -1
+
+    puts = FILAS * len(CAMPOS)
+    db = database.SessionLocal()
+    try:
+        completas = sum(
+            1
+            for fila in crud_laboratorio.get_all_materia_prima_entries(db, 0, 10**6)
+            if fila.ciclo == ciclo and fila.dprom is not None and fila.hprom == 62.0
+        )
+    finally:
+        db.close()
+    modo = "diferida" if diferida else "directa "
+    disco = (
+        f"{flushes / total:6.0f}/s ({flushes / puts:.2f}/PUT)"
+        if flushes >= 0
+        else "n/d"
+    )
+    print(
+        f"{modo} {usuarios} usuario(s): {puts / respuesta:6.0f} PUT/s "
+        f"(con vuelco final {puts / total:6.0f}/s) | fsync diario "
+        f"{fsyncs_diario / total:5.0f}/s ({fsyncs_diario / puts:.2f}/PUT) | "
+        f"flush disco {disco} | filas completas {completas}/{FILAS}"
+    )
+
+
+# Proceso hijo: encola un PUT por campo y muere sin volcar ni cerrar el diario
+_CAIDA = """
+import os
+from app.crud import crud_escritura_diferida, crud_laboratorio
+from app.db import database
+from app.schemas import laboratorio_schemas as schemas
+crud_escritura_diferida.iniciar()
+db = database.SessionLocal()
+for campo, valor in {campos!r}:
+    crud_laboratorio.update_materia_prima_entry(
+        db, {ciclo!r}, "ORIGEN_0000", "TAMO",
+        schemas.MateriaPrimaDataUpdate(**{{campo: valor}}),
+    )
+os._exit(0)
+"""
+
+
+def _fila(ciclo: str):
+    db = database.SessionLocal()
+    try:
+        return crud_laboratorio.get_or_create_materia_prima_entry(
+            db, ciclo, "ORIGEN_0000", "TAMO"
+        )
+    finally:
+        db.close()
+
+
+def _resultado(nombre: str, correcto: bool) -> None:
+    print(f"  {nombre}: {'OK' if correcto else 'FALLO'}")
+
+
+def comprobar() -> None:
+    print("Comprobaciones")
+    diario = settings.ESCRITURA_DIFERIDA_DIARIO
+    esperado = {campo: valor for campo, valor in CAMPOS}
+
+    # 1) Caída con PUT confirmados solo en el diario
+    with contextlib.redirect_stdout(io.StringIO()):
+        _fila("BENCH_CAIDA")
+    subprocess.run(
+        [sys.executable, "-c", _CAIDA.format(campos=CAMPOS, ciclo="BENCH_CAIDA")],
+        env=dict(
+            os.environ, ESCRITURA_DIFERIDA="true", ESCRITURA_DIFERIDA_INTERVALO="3600"
+        ),
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    settings.ESCRITURA_DIFERIDA = False  # Arranque normal: solo recupera
+    with contextlib.redirect_stdout(io.StringIO()):
+        antes = _fila("BENCH_CAIDA").ph
+        crud_escritura_diferida.iniciar()
+        fila = _fila("BENCH_CAIDA")
+    _resultado(
+        "recuperación tras caída",
+        antes is None
+        and all(getattr(fila, c) == v for c, v in esperado.items())
+        and fila.hprom == 62.0
+        and not os.path.exists(diario),
+    )
+
+    # 2) El diario recuperado no se puede volcar: el arranque falla y el diario queda
+    with contextlib.redirect_stdout(io.StringIO()):
+        _fila("BENCH_FALLO")
+    subprocess.run(
+        [sys.executable, "-c", _CAIDA.format(campos=CAMPOS, ciclo="BENCH_FALLO")],
+        env=dict(
+            os.environ, ESCRITURA_DIFERIDA="true", ESCRITURA_DIFERIDA_INTERVALO="3600"
+        ),
+        stdout=subprocess.DEVNULL,
+        check=True,
+    )
+    with database.engine.begin() as conexion:
+        conexion.execute(
+            text(
+                "CREATE TRIGGER bench_fallo BEFORE UPDATE ON lab_materia_prima "
+                "BEGIN SELECT RAISE(ABORT, 'fallo simulado'); END"
+            )
+        )
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            crud_escritura_diferida.iniciar()
+            fallo = False
+        except RuntimeError:
+            fallo = True
+        diarios_tras_fallo = glob.glob(diario + "*")
+        sin_volcar = _fila("BENCH_FALLO").ph
+    with database.engine.begin() as conexion:
+        conexion.execute(text("DROP TRIGGER bench_fallo"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        crud_escritura_diferida.iniciar()
+        fila = _fila("BENCH_FALLO")
+    _resultado(
+        "diario conservado si no se puede volcar",
+        fallo
+        and sin_volcar is None
+        and len(diarios_tras_fallo) > 1
+        and not crud_escritura_diferida.activo()
+        and all(getattr(fila, c) == v for c, v in esperado.items())
+        and not glob.glob(diario + "*"),
+    )
+
+    settings.ESCRITURA_DIFERIDA = True
+    with contextlib.redirect_stdout(io.StringIO()):
+        _fila("BENCH_BLOQUEO")
+        crud_escritura_diferida.iniciar()
+
+    # 3) Mientras se archiva el ciclo sus PUT se rechazan
+    db = database.SessionLocal()
+    try:
+        with crud_escritura_diferida.ciclo_bloqueado("BENCH_BLOQUEO"):
+            crud_laboratorio.update_materia_prima_entry(
+                db,
+                "BENCH_BLOQUEO",
+                "ORIGEN_0000",
+                "TAMO",
+                schemas.MateriaPrimaDataUpdate(ph=7.0),
+            )
+        rechazado = False
+    except crud_archivo.CicloArchivadoError:
+        rechazado = True
+    finally:
+        db.close()
+    _resultado("PUT rechazado durante el archivado", rechazado)
+
+    # 4) La fila desaparece antes del vuelco: el cambio se guarda aparte
+    with contextlib.redirect_stdout(io.StringIO()):
+        fila = _fila("BENCH_BLOQUEO")
+        db = database.SessionLocal()
+        try:
+            crud_laboratorio.update_materia_prima_entry(
+                db,
+                "BENCH_BLOQUEO",
+                "ORIGEN_0000",
+                "TAMO",
+                schemas.MateriaPrimaDataUpdate(ph=6.5),
+            )
+        finally:
+            db.close()
+        with database.engine.begin() as conexion:
+            conexion.execute(
+                delete(models.MateriaPrima).where(models.MateriaPrima.key == fila.key)
+            )
+        crud_escritura_diferida.detener()
+    try:
+        with open(diario + ".sin_fila", encoding="utf-8") as f:
+            guardado = [json.loads(linea) for linea in f]
+    except OSError:
+        guardado = []
+    _resultado(
+        "cambio sin fila conservado",
+        len(guardado) == 1
+        and guardado[0]["key"] == fila.key
+        and guardado[0]["cambios"]["ph"] == 6.5,
+    )
+
+
+def main() -> None:
+    models.Base.metadata.create_all(bind=database.engine)
+    print(
+        f"{FILAS} filas x {len(CAMPOS)} campos = {FILAS * len(CAMPOS)} PUT por corrida"
+    )
+    for usuarios in USUARIOS:
+        for diferida in (False, True):
+            _medir(diferida, usuarios)
+    comprobar()
+    database.engine.dispose()
+    shutil.rmtree(_DIRECTORIO, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# backend_funglusapp/benchmarks/bench_workers.py
+"""
+Mide cómo escala el throughput de lecturas de la API con 1, 2 y 4 workers de
+uvicorn en la misma máquina (modo varios procesos, `python -m app`).
+
+Uso (desde backend_funglusapp):  python -m benchmarks.bench_workers [segundos]
+
+Para cada número de workers arranca el servidor como en producción sobre una BD
+temporal, espera al health check y lo carga con varios clientes (procesos, HTTP
+keep-alive) que repiten una mezcla de GET: listado de laboratorio, sugerencias de
+claves, escaneo de calidad y ciclos. Durante la medición un cliente hace además un
+PUT por segundo para que el canal de invalidación entre workers trabaje.
+El escalado depende de los núcleos libres: los clientes compiten con el servidor.
+"""
+
+import http.client
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SEGUNDOS = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+WORKERS = (1, 2, 4)
+CLIENTES = 8
+PUERTO = 8799
+CICLOS = 20
+ORIGENES_POR_CICLO = 50
+MUESTRAS = ("TAMO", "GALLINAZA", "CASCARILLA")
+
+_DIRECTORIO = tempfile.mkdtemp(prefix="bench_workers_")
+_RUTA_BD = os.path.join(_DIRECTORIO, "bench.db")
+_ENTORNO = dict(
+    os.environ,
+    DATABASE_URL=f"sqlite:///{_RUTA_BD}",
+    ARCHIVO_DIR=os.path.join(_DIRECTORIO, "archivo"),
+    ESCRITURA_DIFERIDA_DIARIO=os.path.join(_DIRECTORIO, "diario"),
+    ESCRITURA_DIFERIDA="false",
+    PORT=str(PUERTO),
+)
+
+LECTURAS = [
+    "/api/v1/laboratorio/materia_prima/?limit=50",
+    "/api/v1/claves/sugerencias?tabla=materia_prima&campo=origen&prefijo=PROV",
+    "/api/v1/calidad/escaneo?ciclo=CICLO_0003",
+    "/api/v1/ciclos/distinct",
+]
+
+
+def _crear_bd() -> None:
+    os.environ.update(_ENTORNO)
+    from app.db import database, dimensiones, models
+    from sqlalchemy import insert
+
+    models.Base.metadata.create_all(bind=database.engine)
+    filas = []
+    for c in range(CICLOS):
+        ciclo_id = dimensiones.obtener_id(models.DimCiclo, f"CICLO_{c:04d}", crear=True)
+        for o in range(ORIGENES_POR_CICLO):
+            origen_id = dimensiones.obtener_id(
+                models.DimOrigen, f"PROVEEDOR_{o:03d}", crear=True
+            )
+            for m, muestra in enumerate(MUESTRAS):
+                filas.append(
+                    {
+                        "ciclo_id": ciclo_id,
+                        "origen_id": origen_id,
+                        "muestra_id": dimensiones.obtener_id(
+                            models.DimMuestra, muestra, crear=True
+                        ),
+                        "porc_h1": 55.0 + (o + m) % 10,
+                        "porc_h2": 56.0 + (o + m) % 10,
+                        "hprom": 55.5 + (o + m) % 10,
+                        "ph": 6.5 + (o % 15) / 10,
+                        "dprom": 1.0 + (c % 5) / 10,
+                    }
+                )
+    with database.engine.begin() as conexion:
+        conexion.execute(insert(models.MateriaPrima), filas)
+    database.engine.dispose()
+    print(f"BD temporal: {_RUTA_BD} ({len(filas)} filas de materia prima)")
+
+
+def _esperar_servidor(proceso: subprocess.Popen) -> None:
+    limite = time.time() + 60
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("El servidor terminó antes de quedar listo")
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", PUERTO, timeout=2)
+            conexion.request("GET", "/api/v1/health")
+            if conexion.getresponse().status == 200:
+                conexion.close()
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("El servidor no respondió al health check")
+
+
+def _cliente(indice: int, hasta: float, resultados) -> None:
+    conexion = http.client.HTTPConnection("127.0.0.1", PUERTO, timeout=30)
+    peticiones = errores = 0
+    proximo_put = time.time()
+    i = indice
+    while time.time() < hasta:
+        if indice == 0 and time.time() >= proximo_put:
+            # Escritura ocasional: cada worker invalida sus cachés por el canal
+            metodo, ruta = "PUT", "/api/v1/laboratorio/materia_prima/entry"
+            cuerpo = json.dumps(
+                {
+                    "ciclo": "CICLO_0003",
+                    "origen": "PROVEEDOR_000",
+                    "muestra": "TAMO",
+                    "ph": 6.0 + (peticiones % 20) / 10,
+                }
+            )
+            proximo_put += 1.0
+        else:
+            metodo, ruta, cuerpo = "GET", LECTURAS[i % len(LECTURAS)], None
+            i += 1
+        try:
+            conexion.request(
+                metodo, ruta, body=cuerpo, headers={"Content-Type": "application/json"}
+            )
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status != 200:
+                errores += 1
+            peticiones += 1
+        except (OSError, http.client.HTTPException):
+            errores += 1
+            conexion.close()
+            conexion = http.client.HTTPConnection("127.0.0.1", PUERTO, timeout=30)
+    conexion.close()
+    resultados.put((peticiones, errores))
+
+
+def _medir(workers: int) -> float:
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "app"],
+        env=dict(_ENTORNO, WORKERS=str(workers)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _esperar_servidor(proceso)
+        time.sleep(1.0)  # Que todos los workers terminen de arrancar
+        resultados = multiprocessing.Queue()
+        hasta = time.time() + SEGUNDOS
+        clientes = [
+            multiprocessing.Process(target=_cliente, args=(c, hasta, resultados))
+            for c in range(CLIENTES)
+        ]
+        for cliente in clientes:
+            cliente.start()
+        totales = [resultados.get() for _ in clientes]
+        for cliente in clientes:
+            cliente.join()
+    finally:
+        proceso.terminate()
+        proceso.wait()
+    peticiones = sum(p for p, _ in totales)
+    errores = sum(e for _, e in totales)
+    por_segundo = peticiones / SEGUNDOS
+    print(
+        f"  {workers} worker(s): {por_segundo:7.0f} peticiones/s "
+        f"({peticiones} en {SEGUNDOS:.0f} s, {errores} errores)"
+    )
+    return por_segundo
+
+
+def main() -> None:
+    _crear_bd()
+    print(
+        f"{CLIENTES} clientes, {SEGUNDOS:.0f} s por corrida, "
+        f"{os.cpu_count()} CPU(s) en el equipo"
+    )
+    base = None
+    for workers in WORKERS:
+        por_segundo = _medir(workers)
+        base = base or por_segundo
+        print(f"    escalado frente a 1 worker: x{por_segundo / base:.2f}")
+    shutil.rmtree(_DIRECTORIO, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()